@@ -0,0 +1,424 @@
+# benchmark.py
+# ------------
+# Micro-benchmarks for the data structures and search code of the search
+# project.  They are not part of the autograder.
+
+
+"""
+Times the data structures in util.py and game.py, the search functions in
+search.py and the eight puzzle solvers of nPuzzle.py.
+
+Run a benchmark by name, for example:
+
+> python benchmark.py priorityQueue -n 10000,100000,1000000
+> python benchmark.py foodStates -l mediumSearch,bigSearch
+> python benchmark.py closestDot -l bigSearch
+> python benchmark.py corridors -l bigMaze,contoursMaze,openMaze -r 20
+> python benchmark.py eightPuzzle -p 20
+
+Use 'python benchmark.py --help' for the list of benchmarks and options.
+"""
+
+import optparse
+import random
+import sys
+import time
+
+import game
+import layout
+import util
+
+
+def timed(function, *args):
+    "Returns (result, seconds) for function(*args)"
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def rate(operations, seconds):
+    "Formats a throughput in operations per second"
+    if seconds <= 0: return '%12s' % 'inf'
+    return '%12.0f' % (operations / seconds)
+
+############################
+# util.PriorityQueue et al #
+############################
+
+def _fill(queue, priorities):
+    for item, priority in enumerate(priorities):
+        queue.push(item, priority)
+
+def _drain(queue):
+    while not queue.isEmpty():
+        queue.pop()
+
+def _update(queue, updates):
+    for item, priority in updates:
+        queue.update(item, priority)
+
+def benchmarkPriorityQueue(options):
+    """
+    Compares push, update (decrease-key) and pop throughput of
+    util.PriorityQueue and util.IndexedPriorityQueue.  The queue is filled
+    with n items, a fixed number of randomly chosen items get a lower
+    priority, and then the queue is drained.
+    """
+    rng = random.Random(options.seed)
+    print('%-22s %9s %12s %12s %12s' % ('queue', 'n', 'push/s', 'update/s', 'pop/s'))
+    for n in options.sizes:
+        priorities = [rng.random() for _ in range(n)]
+        updates = [(item, priorities[item] / 2)
+                   for item in rng.sample(range(n), min(n, options.updates))]
+        for queueClass in [util.PriorityQueue, util.IndexedPriorityQueue]:
+            queue = queueClass()
+            _, pushTime = timed(_fill, queue, priorities)
+            _, updateTime = timed(_update, queue, updates)
+            _, popTime = timed(_drain, queue)
+            print('%-22s %9d %s %s %s' % (queueClass.__name__, n, rate(n, pushTime),
+                                           rate(len(updates), updateTime), rate(n, popTime)))
+            sys.stdout.flush()
+
+##########################
+# game.Grid serialization #
+##########################
+
+def _packCellByCell(grid):
+    "The original Grid.packBits, one cell and one power of two at a time"
+    bits = [grid.width, grid.height]
+    currentInt = 0
+    for i in range(grid.height * grid.width):
+        bit = grid.CELLS_PER_INT - (i % grid.CELLS_PER_INT) - 1
+        x, y = grid._cellIndexToPosition(i)
+        if grid[x][y]:
+            currentInt += 2 ** bit
+        if (i + 1) % grid.CELLS_PER_INT == 0:
+            bits.append(currentInt)
+            currentInt = 0
+    bits.append(currentInt)
+    return tuple(bits)
+
+def _unpackCellByCell(bitRep):
+    "The original Grid._unpackBits, one cell at a time"
+    width, height = bitRep[:2]
+    grid = game.Grid(width, height)
+    cell = 0
+    for packed in bitRep[2:]:
+        for bit in grid._unpackInt(packed, grid.CELLS_PER_INT):
+            if cell == width * height: break
+            x, y = grid._cellIndexToPosition(cell)
+            grid[x][y] = bit
+            cell += 1
+    return grid
+
+def _repeat(function, argument, rounds):
+    for _ in range(rounds):
+        result = function(argument)
+    return result
+
+def benchmarkGridCodec(options):
+    """
+    Round-trips the food and walls Grids of each layout through the original
+    cell by cell packBits/_unpackBits, the current int tuple codec and the
+    compact bytes codec, checking that each gives back the same Grid and that
+    the tuple format has not changed.
+    """
+    codecs = [('cellByCell', _packCellByCell, _unpackCellByCell),
+              ('packBits', game.Grid.packBits, game.reconstituteGrid),
+              ('packBytes', game.Grid.packBytes, game.reconstituteGrid)]
+    print('%-14s %-6s %6s %-11s %6s %12s %12s' %
+          ('layout', 'grid', 'cells', 'codec', 'bytes', 'pack/s', 'unpack/s'))
+    for name in options.layouts:
+        lay = layout.getLayout(name)
+        if lay == None: raise Exception("The layout " + name + " cannot be found")
+        for gridName, grid in [('walls', lay.walls), ('food', lay.food)]:
+            expected = _packCellByCell(grid)
+            for codecName, pack, unpack in codecs:
+                packed, packTime = timed(_repeat, pack, grid, options.rounds)
+                unpacked, unpackTime = timed(_repeat, unpack, packed, options.rounds)
+                if unpacked != grid or (codecName == 'packBits' and packed != expected):
+                    raise Exception('%s does not round-trip the %s of %s' % (codecName, gridName, name))
+                size = len(packed) if codecName == 'packBytes' else 4 * len(packed)
+                print('%-14s %-6s %6d %-11s %6d %s %s' % (name, gridName, grid.width * grid.height, codecName,
+                                                         size, rate(options.rounds, packTime),
+                                                         rate(options.rounds, unpackTime)))
+                sys.stdout.flush()
+
+############################
+# FoodSearchProblem states #
+############################
+
+def _exploreStates(problem, limit):
+    """
+    Breadth first exploration of at most limit expansions from the start
+    state.  Returns the set of states reached.
+    """
+    start = problem.getStartState()
+    reached = set([start])
+    frontier = [start]
+    expansions = 0
+    while frontier and expansions < limit:
+        nextFrontier = []
+        for state in frontier:
+            if expansions == limit: break
+            expansions += 1
+            for successor, action, cost in problem.getSuccessors(state):
+                if successor not in reached:
+                    reached.add(successor)
+                    nextFrontier.append(successor)
+        frontier = nextFrontier
+    return reached
+
+def benchmarkFoodStates(options):
+    """
+    Compares FoodSearchProblem, whose states hold a food Grid, with
+    CompactFoodSearchProblem, whose states are a pair of ints.  Each explores
+    the same options.expansions states breadth first, keeping every state it
+    reaches as a search would; the run is timed, then repeated under
+    tracemalloc for the memory the reached states take.
+    """
+    import tracemalloc
+    import pacman
+    import searchAgents
+    print('%-14s %-26s %10s %9s %14s %12s' %
+          ('layout', 'problem', 'expansions', 'states', 'expansions/s', 'bytes/state'))
+    for name in options.layouts:
+        lay = layout.getLayout(name)
+        if lay == None: raise Exception("The layout " + name + " cannot be found")
+        gameState = pacman.GameState()
+        gameState.initialize(lay, 0)
+        for problemClass in [searchAgents.FoodSearchProblem, searchAgents.CompactFoodSearchProblem]:
+            problem = problemClass(gameState)
+            reached, seconds = timed(_exploreStates, problem, options.expansions)
+            numStates = len(reached)
+            del reached
+            tracemalloc.start()
+            reached = _exploreStates(problemClass(gameState), options.expansions)
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            del reached
+            print('%-14s %-26s %10d %9d %s %12.0f' % (name, problemClass.__name__, problem._expanded, numStates,
+                                                      rate(problem._expanded, seconds), memory / numStates))
+            sys.stdout.flush()
+
+######################################
+# Bidirectional and closest dot search #
+######################################
+
+def _gameState(name):
+    import pacman
+    lay = layout.getLayout(name)
+    if lay == None: raise Exception("The layout " + name + " cannot be found")
+    gameState = pacman.GameState()
+    gameState.initialize(lay, 0)
+    return gameState
+
+def benchmarkBidirectional(options):
+    """
+    Compares breadth first and uniform cost search with their bidirectional
+    versions on the PositionSearchProblem of each layout, checking that both
+    find paths of the same cost.
+    """
+    import search
+    import searchAgents
+    searches = [('bfs', search.bfs, search.bibfs), ('ucs', search.ucs, search.biucs)]
+    print('%-14s %-6s %6s %10s %10s %10s %10s' %
+          ('layout', 'search', 'cost', 'expanded', 'biExpanded', 'seconds', 'biSeconds'))
+    for name in options.layouts:
+        gameState = _gameState(name)
+        for searchName, oneWay, bothWays in searches:
+            results = []
+            for function in [oneWay, bothWays]:
+                problem = searchAgents.PositionSearchProblem(gameState, warn=False, visualize=False)
+                actions, seconds = timed(_repeat, function, problem, options.rounds)
+                results.append((problem.getCostOfActions(actions), problem._expanded // options.rounds, seconds))
+            if results[0][0] != results[1][0]:
+                raise Exception('bidirectional %s found a different path cost on %s' % (searchName, name))
+            print('%-14s %-6s %6d %10d %10d %10.4f %10.4f' % (name, searchName, results[0][0], results[0][1],
+                                                            results[1][1], results[0][2], results[1][2]))
+            sys.stdout.flush()
+
+def _repeatedSearch(gameState):
+    "ClosestDotSearchAgent: a breadth first search per dot.  Returns (cost, expanded)"
+    import search
+    import searchAgents
+    actions, expanded = [], 0
+    while gameState.getFood().count() > 0:
+        problem = searchAgents.AnyFoodSearchProblem(gameState)
+        path = search.bfs(problem)
+        expanded += problem._expanded
+        for action in path:
+            gameState = gameState.generateSuccessor(0, action)
+        actions += path
+    return len(actions), expanded
+
+def _incrementalSearch(gameState):
+    "IncrementalClosestDotSearchAgent: one NearestGoalField.  Returns (cost, expanded)"
+    import search
+    import searchAgents
+    field = search.NearestGoalField(searchAgents.getSuccessorTable(gameState.getWalls()),
+                                    gameState.getFood().asList())
+    cost = 0
+    while gameState.getFood().count() > 0:
+        path, dot = field.pathFrom(gameState.getPacmanPosition())
+        field.removeGoal(dot)
+        for action in path:
+            gameState = gameState.generateSuccessor(0, action)
+        cost += len(path)
+    return cost, field.expanded
+
+def benchmarkClosestDot(options):
+    """
+    Eats all the food of each layout closest dot first, with a breadth first
+    search from pacman per dot and with one lazily repaired nearest dot
+    field (search.NearestGoalField), and reports the total cells expanded and the time.
+    Both play the moves out on GameStates, as the agents do.  The two may break ties between equally close dots differently, so the
+    total path costs can differ.
+    """
+    print('%-14s %6s %-12s %8s %10s %10s' % ('layout', 'dots', 'search', 'cost', 'expanded', 'seconds'))
+    for name in options.layouts:
+        gameState = _gameState(name)
+        for searchName, function in [('repeatedBFS', _repeatedSearch), ('incremental', _incrementalSearch)]:
+            (cost, expanded), seconds = timed(function, gameState)
+            print('%-14s %6d %-12s %8d %10d %10.4f' % (name, gameState.getNumFood(), searchName,
+                                                      cost, expanded, seconds))
+            sys.stdout.flush()
+
+##############################
+# Corridor-contracted search #
+##############################
+
+def benchmarkCorridors(options):
+    """
+    Compares uniform cost and A* (Manhattan) search over every cell, on the
+    PositionSearchProblem of each layout, with the same searches over the
+    junctions of its JunctionGraph, on the CorridorSearchProblem, checking
+    that both find paths of the same cost.  The time to build the
+    JunctionGraph, once per layout, is reported separately.
+    """
+    import search
+    import searchAgents
+    import junctionGraph
+    searches = [('ucs', search.ucs),
+                ('astar', lambda problem: search.astar(problem, searchAgents.manhattanHeuristic))]
+    print('%-14s %6s %9s %-6s %-9s %6s %10s %10s' %
+          ('layout', 'cells', 'junctions', 'search', 'problem', 'cost', 'expanded', 'seconds'))
+    for name in options.layouts:
+        gameState = _gameState(name)
+        walls = gameState.getWalls()
+        successorTable = searchAgents.getSuccessorTable(walls)
+        graph, buildTime = timed(junctionGraph.JunctionGraph, successorTable)
+        print('%-14s %6d %9d %-6s %-9s %6s %10s %10.4f' % (name, graph.numCells, len(graph.junctions),
+                                                           'build', '', '', '', buildTime))
+        junctionGraph.getJunctionGraph(walls, successorTable)
+        for searchName, function in searches:
+            costs = []
+            for problemName, problemClass in [('cells', searchAgents.PositionSearchProblem),
+                                              ('corridors', searchAgents.CorridorSearchProblem)]:
+                problem = problemClass(gameState, warn=False, visualize=False)
+                actions, seconds = timed(_repeat, function, problem, options.rounds)
+                costs.append(problem.getCostOfActions(actions))
+                print('%-14s %6d %9d %-6s %-9s %6d %10d %10.4f' % (name, graph.numCells, len(graph.junctions),
+                                                                   searchName, problemName, costs[-1],
+                                                                   problem._expanded // options.rounds, seconds))
+                sys.stdout.flush()
+            if costs[0] != costs[1]:
+                raise Exception('corridor %s found a different path cost on %s' % (searchName, name))
+
+################
+# Eight puzzle #
+################
+
+def benchmarkEightPuzzle(options):
+    """
+    Solves options.puzzles createRandomEightPuzzle instances with breadth
+    first search on EightPuzzleSearchProblem, as eightpuzzle.py does, and
+    with searches on the packed boards of nPuzzle, checking that all find
+    paths of the same length.  The time to build (or load) the pattern
+    databases is reported separately.
+    """
+    import eightpuzzle
+    import nPuzzle
+    import search
+
+    class CountingEightPuzzleSearchProblem(eightpuzzle.EightPuzzleSearchProblem):
+        _expanded = 0
+        def getSuccessors(self, state):
+            self._expanded += 1
+            return eightpuzzle.EightPuzzleSearchProblem.getSuccessors(self, state)
+
+    solvers = [
+        ('bfs', 'EightPuzzleState', CountingEightPuzzleSearchProblem, search.bfs),
+        ('bfs', 'packed', nPuzzle.NPuzzleSearchProblem, search.bfs),
+        ('astar', 'packed+manhattan', nPuzzle.NPuzzleSearchProblem,
+         lambda problem: search.astar(problem, nPuzzle.manhattanHeuristic)),
+        ('astar', 'packed+pdb', nPuzzle.NPuzzleSearchProblem,
+         lambda problem: search.astar(problem, nPuzzle.patternDatabaseHeuristic)),
+        ('idastar', 'packed+pdb', nPuzzle.NPuzzleSearchProblem,
+         lambda problem: search.idastar(problem, nPuzzle.patternDatabaseHeuristic)),
+    ]
+    random.seed(options.seed)
+    puzzles = [eightpuzzle.createRandomEightPuzzle(options.moves) for _ in range(options.puzzles)]
+    _, seconds = timed(nPuzzle.getPatternDatabase, 3)
+    print('pattern databases ready in %.3f seconds' % seconds)
+    print('%-8s %-18s %8s %10s %10s' % ('search', 'problem', 'moves', 'expanded', 'seconds'))
+    lengths = None
+    for searchName, problemName, problemClass, function in solvers:
+        solution, totalExpanded, totalSeconds = [], 0, 0
+        for puzzle in puzzles:
+            if problemClass is nPuzzle.NPuzzleSearchProblem:
+                problem = problemClass(nPuzzle.fromEightPuzzle(puzzle))
+            else:
+                problem = problemClass(puzzle)
+            actions, seconds = timed(function, problem)
+            solution.append(len(actions))
+            totalExpanded += problem._expanded
+            totalSeconds += seconds
+        if lengths is not None and solution != lengths:
+            raise Exception('%s on %s found paths of different lengths' % (searchName, problemName))
+        lengths = solution
+        print('%-8s %-18s %8.1f %10.1f %10.4f' % (searchName, problemName, sum(solution) / len(puzzles),
+                                                 totalExpanded / len(puzzles), totalSeconds / len(puzzles)))
+        sys.stdout.flush()
+
+BENCHMARKS = {
+    'bidirectional': benchmarkBidirectional,
+    'closestDot': benchmarkClosestDot,
+    'corridors': benchmarkCorridors,
+    'eightPuzzle': benchmarkEightPuzzle,
+    'foodStates': benchmarkFoodStates,
+    'gridCodec': benchmarkGridCodec,
+    'priorityQueue': benchmarkPriorityQueue,
+}
+
+def readCommand(argv):
+    usageStr = """
+    USAGE:      python benchmark.py <benchmark> <options>
+    BENCHMARKS: %s
+    """ % ', '.join(sorted(BENCHMARKS))
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-n', '--sizes', dest='sizes', default='10000,100000,1000000',
+                      help='comma separated problem sizes (default %default)')
+    parser.add_option('-u', '--updates', dest='updates', type='int', default=200,
+                      help='number of update calls per queue (default %default)')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=188,
+                      help='random seed (default %default)')
+    parser.add_option('-l', '--layouts', dest='layouts', default='tinyMaze,mediumMaze,bigMaze,bigSearch',
+                      help='comma separated layout names (default %default)')
+    parser.add_option('-x', '--expansions', dest='expansions', type='int', default=20000,
+                      help='state expansions for foodStates (default %default)')
+    parser.add_option('-p', '--puzzles', dest='puzzles', type='int', default=20,
+                      help='random puzzles for eightPuzzle (default %default)')
+    parser.add_option('-m', '--moves', dest='moves', type='int', default=100,
+                      help='random moves per eightPuzzle puzzle (default %default)')
+    parser.add_option('-r', '--rounds', dest='rounds', type='int', default=1000,
+                      help='repetitions of each timed operation (default %default)')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1 or args[0] not in BENCHMARKS:
+        parser.error('pick one benchmark from: ' + ', '.join(sorted(BENCHMARKS)))
+    options.sizes = [int(n) for n in options.sizes.split(',')]
+    options.layouts = options.layouts.split(',')
+    return BENCHMARKS[args[0]], options
+
+if __name__ == '__main__':
+    benchmark, options = readCommand(sys.argv[1:])
+    benchmark(options)
@@ -0,0 +1,158 @@
+# distanceOracle.py
+# -----------------
+# All-pairs maze distances for a layout, computed once and cached on disk.
+
+
+"""
+A MazeDistanceOracle answers maze distance queries between any two open
+cells of a layout with a single table lookup.
+
+The open cells of the walls Grid are numbered 0..n-1 (in Grid.asList(False)
+order) and the distances between all pairs of them are computed once, with a
+breadth first search from every cell, into an n x n uint16 matrix.  When
+NumPy is available the matrix is saved to CACHE_DIRECTORY under a hash of
+the walls, and later runs on the same layout load it with
+np.load(mmap_mode='r') instead of recomputing it.
+
+Example:
+oracle = getMazeDistanceOracle(gameState.getWalls())
+oracle.getDistance( (1,1), (10,10) )
+"""
+
+import os
+import hashlib
+from array import array
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'distanceCache')
+UNREACHABLE = 65535 # Distance stored for pairs of cells with no path between them
+
+class MazeDistanceOracle:
+    """
+    All-pairs shortest path distances between the open cells of a walls Grid.
+    """
+
+    def __init__(self, walls, cacheDirectory=CACHE_DIRECTORY):
+        """
+        walls: the walls Grid of a layout
+        cacheDirectory: where distance matrices are saved, or None to always
+                        compute them in memory
+        """
+        self.cells = walls.asList(False)
+        self.cellIds = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.key = wallsKey(walls)
+        self.distances = None
+        path = None
+        if np is not None and cacheDirectory is not None:
+            path = os.path.join(cacheDirectory, self.key + '.npy')
+            self.distances = self._load(path)
+        if self.distances is None:
+            self.distances = self._compute(walls)
+            if path is not None:
+                self._save(path)
+
+    def getCellId(self, position):
+        """
+        Returns the integer ID of an open (x,y) cell.
+        """
+        return self.cellIds[position]
+
+    def getDistance(self, pos1, pos2):
+        """
+        Returns the maze distance between two open cells, or UNREACHABLE if
+        there is no path between them.
+        """
+        i, j = self.cellIds[pos1], self.cellIds[pos2]
+        if np is not None:
+            return int(self.distances[i, j])
+        return self.distances[i][j]
+
+    def getDistancesFrom(self, position):
+        """
+        Returns the row of distances from position to every cell ID.
+        """
+        return self.distances[self.cellIds[position]]
+
+    def _compute(self, walls):
+        cellIds = self.cellIds
+        neighbors = []
+        for x, y in self.cells:
+            neighbors.append([cellIds[cell] for cell in
+                              ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)) if cell in cellIds])
+        numCells = len(self.cells)
+        rows = []
+        for source in range(numCells):
+            row = array('H', [UNREACHABLE]) * numCells
+            row[source] = 0
+            queue = deque([source])
+            while queue:
+                cell = queue.popleft()
+                nextDistance = row[cell] + 1
+                for neighbor in neighbors[cell]:
+                    if row[neighbor] == UNREACHABLE:
+                        row[neighbor] = nextDistance
+                        queue.append(neighbor)
+            rows.append(row)
+        if np is None:
+            return rows
+        distances = np.empty((numCells, numCells), dtype=np.uint16)
+        for source, row in enumerate(rows):
+            distances[source] = np.frombuffer(row, dtype=np.uint16)
+        return distances
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            distances = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        numCells = len(self.cells)
+        if distances.shape != (numCells, numCells) or distances.dtype != np.uint16:
+            return None
+        # A plain ndarray view still reads from the mapped file, but indexes
+        # without the np.memmap subclass overhead.
+        return distances.view(np.ndarray)
+
+    def _save(self, path):
+        # Write to a temporary file first so that concurrent runs never load
+        # a partially written matrix.
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporaryPath = '%s.%d.tmp' % (path, os.getpid())
+            with open(temporaryPath, 'wb') as f:
+                np.save(f, self.distances)
+            os.replace(temporaryPath, path)
+        except OSError:
+            pass
+
+def wallsKey(walls):
+    """
+    Returns a hex digest identifying the shape of a walls Grid.
+    """
+    cells = ''.join(['1' if wall else '0' for column in walls.data for wall in column])
+    text = '%d,%d,%s' % (walls.width, walls.height, cells)
+    return hashlib.sha1(text.encode('ascii')).hexdigest()
+
+_oracles = {}
+_oraclesByWalls = {}
+
+def getMazeDistanceOracle(walls, cacheDirectory=CACHE_DIRECTORY):
+    """
+    Returns the MazeDistanceOracle for walls, building (or loading) it the
+    first time a layout is seen in this process.
+    """
+    entry = _oraclesByWalls.get(id(walls))
+    if entry is not None and entry[0] is walls:
+        return entry[1]
+    key = wallsKey(walls)
+    if key not in _oracles:
+        _oracles[key] = MazeDistanceOracle(walls, cacheDirectory)
+    # Keep a reference to walls so that its id cannot be reused while cached
+    _oraclesByWalls[id(walls)] = (walls, _oracles[key])
+    return _oracles[key]
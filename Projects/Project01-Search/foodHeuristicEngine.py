@@ -0,0 +1,118 @@
+# foodHeuristicEngine.py
+# ----------------------
+# A consistent, memoized heuristic for the FoodSearchProblem.
+
+
+"""
+A FoodHeuristicEngine evaluates the heuristic
+
+  h(position, food) = max( distance to the farthest food,
+                           distance to the nearest food + MST(food) )
+
+with maze distances, where MST(food) is the weight of a minimum spanning
+tree of the remaining food under maze distances.  Both terms are consistent
+heuristics, so their max is one too.
+
+The food of the problem's start state is numbered 0..k-1, and a set of
+remaining food is a bitmask over those numbers.  The pairwise maze distances
+between the food are looked up once, from the layout's MazeDistanceOracle,
+and the MST weight is memoized per food bitmask, so a heuristic call costs
+O(remaining food) plus, the first time its food set is seen, an O(k^2)
+Prim's algorithm.
+
+Example:
+engine = getFoodHeuristicEngine(problem)
+engine.getValue(position, engine.getFoodMask(foodGrid))
+"""
+
+from distanceOracle import getMazeDistanceOracle
+
+
+class FoodHeuristicEngine:
+    """
+    The food heuristic of one FoodSearchProblem.
+    """
+
+    def __init__(self, walls, foodGrid):
+        """
+        walls: the walls Grid of the problem
+        foodGrid: the food Grid of the start state
+        """
+        self.oracle = getMazeDistanceOracle(walls)
+        self.foods = foodGrid.asList()
+        self.foodIds = dict((food, i) for i, food in enumerate(self.foods))
+        # distancesFrom[i][c]: maze distance from food i to the cell with ID c
+        self.distancesFrom = [self.oracle.getDistancesFrom(food).tolist() for food in self.foods]
+        self.pairwise = [[row[self.oracle.getCellId(food)] for food in self.foods]
+                         for row in self.distancesFrom]
+        self.mstWeights = {0: 0}
+
+    def getFoodMask(self, foodGrid):
+        """
+        Returns the bitmask of the start state's food still in foodGrid.
+        """
+        mask = 0
+        for i, (x, y) in enumerate(self.foods):
+            if foodGrid[x][y]:
+                mask |= 1 << i
+        return mask
+
+    def getValue(self, position, mask):
+        """
+        Returns the heuristic value of pacman at position with the food in
+        mask left.
+        """
+        if mask == 0:
+            return 0
+        cell = self.oracle.getCellId(position)
+        nearest, farthest = float('inf'), 0
+        for i in maskIndices(mask):
+            distance = self.distancesFrom[i][cell]
+            if distance < nearest:
+                nearest = distance
+            if distance > farthest:
+                farthest = distance
+        return max(farthest, nearest + self.getMSTWeight(mask))
+
+    def getMSTWeight(self, mask):
+        """
+        Returns the weight of a minimum spanning tree of the food in mask,
+        computed with Prim's algorithm the first time mask is seen.
+        """
+        weight = self.mstWeights.get(mask)
+        if weight is not None:
+            return weight
+        foods = list(maskIndices(mask))
+        pairwise = self.pairwise
+        first = foods.pop()
+        best = dict((i, pairwise[first][i]) for i in foods)
+        weight = 0
+        while best:
+            closest = min(best, key=best.get)
+            weight += best.pop(closest)
+            row = pairwise[closest]
+            for i in best:
+                if row[i] < best[i]:
+                    best[i] = row[i]
+        self.mstWeights[mask] = weight
+        return weight
+
+
+def maskIndices(mask):
+    "Yields the indices of the set bits of mask, lowest first"
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def getFoodHeuristicEngine(problem):
+    """
+    Returns the FoodHeuristicEngine of a FoodSearchProblem (or
+    CompactFoodSearchProblem), kept in problem.heuristicInfo.  Its food
+    numbering is the asList() order of the starting food.
+    """
+    if 'foodHeuristicEngine' not in problem.heuristicInfo:
+        problem.heuristicInfo['foodHeuristicEngine'] = \
+            FoodHeuristicEngine(problem.walls, problem.startingGameState.getFood())
+    return problem.heuristicInfo['foodHeuristicEngine']
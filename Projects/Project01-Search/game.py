@@ -24,6 +24,12 @@ from util import *
 import time, os
 import traceback
 import sys
+import struct
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 #######################
 # Parts worth reading #
@@ -231,19 +237,25 @@ class Grid:
         Returns an efficient int list representation
 
         (width, height, bitPackedInts...)
+
+        Cells are taken in _cellIndexToPosition order, CELLS_PER_INT cells to an
+        int with the first cell in the most significant bit.  The last int is
+        zero padded, and is all padding when the cells fill every other int.
+        """
+        numInts = self.width * self.height // self.CELLS_PER_INT + 1
+        packed = _packCells(self.data, numInts * self.CELLS_PER_INT)
+        return (self.width, self.height) + tuple(_splitInt(packed, numInts, self.CELLS_PER_INT))
+
+    def packBytes(self):
         """
-        bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
-        return tuple(bits)
+        Returns a compact bytes representation, for recording games
+
+        The width and height as big-endian 16 bit ints, followed by one bit per
+        cell in packBits order, zero padded to a whole byte.
+        """
+        numBytes = (self.width * self.height + 7) // 8
+        packed = _packCells(self.data, numBytes * 8)
+        return struct.pack('>HH', self.width, self.height) + packed.to_bytes(numBytes, 'big')
 
     def _cellIndexToPosition(self, index):
         x = index // self.height
@@ -254,13 +266,11 @@ class Grid:
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
         for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height: break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
+            if packed < 0: raise ValueError("must be a positive integer")
+            if packed >> self.CELLS_PER_INT: raise ValueError("must fit in CELLS_PER_INT bits")
+        packed = _joinInts(bits, self.CELLS_PER_INT)
+        self.data = _unpackCells(packed, len(bits) * self.CELLS_PER_INT, self.width, self.height)
 
     def _unpackInt(self, packed, size):
         bools = []
@@ -275,11 +285,65 @@ class Grid:
         return bools
 
 def reconstituteGrid(bitRep):
+    """
+    Rebuilds a Grid from its packBits tuple or packBytes bytes.  Anything else
+    is assumed to be a Grid already and returned unchanged.
+    """
+    if type(bitRep) is bytes:
+        width, height = struct.unpack('>HH', bitRep[:4])
+        grid = Grid(width, height)
+        body = bitRep[4:]
+        grid.data = _unpackCells(int.from_bytes(body, 'big'), len(body) * 8, width, height)
+        return grid
     if type(bitRep) is not type((1,2)):
         return bitRep
     width, height = bitRep[:2]
     return Grid(width, height, bitRepresentation= bitRep[2:])
 
+# The packed forms of a Grid all read its cells, column by column, as one
+# big-endian bit string.  These helpers convert between the list of columns
+# and that bit string held in a single int, vectorized with NumPy when it is
+# available.
+
+def _packCells(data, numBits):
+    "Returns the cells of a list of columns as a numBits int, zero padded on the right"
+    numCells = sum([len(column) for column in data])
+    if np is not None:
+        cells = np.array(data, dtype=bool).ravel()
+        packed = int.from_bytes(np.packbits(cells).tobytes(), 'big')
+        paddedCells = (numCells + 7) // 8 * 8
+    else:
+        bits = ''.join(['1' if cell else '0' for column in data for cell in column])
+        packed = int(bits, 2) if bits else 0
+        paddedCells = numCells
+    return packed << numBits - paddedCells if numBits >= paddedCells else packed >> paddedCells - numBits
+
+def _unpackCells(packed, numBits, width, height):
+    "Returns the list of columns whose cells are the first bits of a numBits int"
+    numCells = width * height
+    if numBits < numCells:
+        packed <<= numCells - numBits
+        numBits = numCells
+    if np is not None:
+        numBytes = (numBits + 7) // 8
+        body = np.frombuffer((packed << numBytes * 8 - numBits).to_bytes(numBytes, 'big'), dtype=np.uint8)
+        cells = np.unpackbits(body, count=numCells).astype(bool)
+        return cells.reshape(width, height).tolist()
+    bits = format(packed >> numBits - numCells, '0%db' % numCells) if numCells else ''
+    return [[bit == '1' for bit in bits[x * height:(x + 1) * height]] for x in range(width)]
+
+def _splitInt(packed, numInts, size):
+    "Splits a numInts * size bit int into numInts ints of size bits, most significant first"
+    mask = (1 << size) - 1
+    return [(packed >> (numInts - i - 1) * size) & mask for i in range(numInts)]
+
+def _joinInts(ints, size):
+    "Concatenates ints of size bits into one int, the first in the most significant bits"
+    packed = 0
+    for value in ints:
+        packed = (packed << size) | value
+    return packed
+
 ####################################
 # Parts you shouldn't have to read #
 ####################################
@@ -0,0 +1,158 @@
+# junctionGraph.py
+# ----------------
+# A layout's open cells with the corridors between junctions contracted.
+
+
+"""
+A JunctionGraph is the graph of a layout's open cells in which every
+corridor, a run of cells with exactly two open neighbors, is contracted
+into a single edge between the cells at its ends, the junctions: cells
+with one, three or four open neighbors.  (A loop made of corridor cells
+only gets one of its cells as a junction.)
+
+An edge from a junction is a tuple (target, actions, cells, corridor):
+
+  target:   the junction at the other end of the corridor
+  actions:  the tuple of Directions that walks it
+  cells:    the tuple of cells entered along the way, ending with target
+  corridor: an ID shared by both directions of the corridor, or None if
+            the two junctions are next to each other
+
+so a search over junctions expands a whole corridor at once.  Cells in the
+middle of a corridor, such as pacman's start or the goal of a search, can be
+made stops: edges that run through a stop end there, and the edges out of
+a stop go to both ends of its corridor (see getEdges).  The tuples of
+actions along a path of edges flatten back into Directions with
+expandActions.
+
+Example:
+graph = getJunctionGraph(walls, searchAgents.getSuccessorTable(walls))
+stops = graph.getStops([start, goal])
+for target, actions, cells, corridor in graph.getEdges(start, stops): ...
+"""
+
+from game import Actions
+from distanceOracle import wallsKey
+
+
+class JunctionGraph:
+    """
+    The corridor-contracted graph of the open cells of a walls Grid.
+    """
+
+    def __init__(self, successorTable):
+        """
+        successorTable: the ((nextCell, action), ...) moves of each open cell,
+                        as searchAgents.getSuccessorTable builds them
+        """
+        self.moves = successorTable
+        self.numCells = len(self.moves)
+        self.junctions = set(cell for cell, moves in self.moves.items() if len(moves) != 2)
+        self.edges = {}
+        # corridorCells[cell] = (junction, index of the edge in edges[junction],
+        # index of cell in the cells of that edge) for each cell of a corridor
+        self.corridorCells = {}
+        self.numCorridors = 0
+        for junction in sorted(self.junctions):
+            self._addEdges(junction)
+        for cell in sorted(self.moves):
+            if cell not in self.junctions and cell not in self.corridorCells:
+                # A loop of corridor cells with no junction on it
+                self.junctions.add(cell)
+                self._addEdges(cell)
+
+    def _addEdges(self, junction):
+        edges = []
+        for cell, action in self.moves[junction]:
+            previous, actions, cells = junction, [action], [cell]
+            while cell not in self.junctions:
+                cell, action = [move for move in self.moves[cell] if move[0] != previous][0]
+                previous = cells[-1]
+                actions.append(action)
+                cells.append(cell)
+            corridor = None
+            if len(cells) > 1:
+                if cells[0] in self.corridorCells:
+                    # The way back along a corridor found before, possibly
+                    # from this junction if the corridor is a loop
+                    owner, edgeIndex, _ = self.corridorCells[cells[0]]
+                    corridor = (edges if owner == junction else self.edges[owner])[edgeIndex][3]
+                else:
+                    corridor = self.numCorridors
+                    self.numCorridors += 1
+                    for i, corridorCell in enumerate(cells[:-1]):
+                        self.corridorCells[corridorCell] = (junction, len(edges), i)
+            edges.append((cell, tuple(actions), tuple(cells), corridor))
+        self.edges[junction] = tuple(edges)
+
+    def _getEdge(self, cell):
+        "Returns the edge the corridor cell was first found on"
+        junction, edgeIndex, _ = self.corridorCells[cell]
+        return self.edges[junction][edgeIndex]
+
+    def getStops(self, cells):
+        """
+        Returns the stops for the given cells, to pass to getEdges: a
+        dictionary from corridor ID to the cells of that corridor to stop at.
+        Junctions need no stop and are left out.
+        """
+        stops = {}
+        for cell in cells:
+            if cell in self.corridorCells:
+                stops.setdefault(self._getEdge(cell)[3], set()).add(cell)
+        return stops
+
+    def getEdges(self, cell, stops={}):
+        """
+        Returns the edges out of a junction or a corridor cell, each cut short
+        at the first cell of stops (see getStops) on it.
+        """
+        if cell in self.junctions:
+            edges = self.edges[cell]
+        else:
+            junction, _, i = self.corridorCells[cell]
+            target, actions, cells, corridor = self._getEdge(cell)
+            backActions = tuple([Actions.reverseDirection(action) for action in actions[i::-1]])
+            backCells = cells[i - 1::-1] + (junction,) if i > 0 else (junction,)
+            edges = ((target, actions[i + 1:], cells[i + 1:], corridor),
+                     (junction, backActions, backCells, corridor))
+        if not stops:
+            return edges
+        cutEdges = []
+        for edge in edges:
+            target, actions, cells, corridor = edge
+            corridorStops = stops.get(corridor)
+            if corridorStops:
+                for i, edgeCell in enumerate(cells):
+                    if edgeCell in corridorStops:
+                        edge = (edgeCell, actions[:i + 1], cells[:i + 1], corridor)
+                        break
+            cutEdges.append(edge)
+        return cutEdges
+
+
+def expandActions(actions):
+    """
+    Flattens a list of Directions and tuples of Directions (the actions of
+    JunctionGraph edges) into a list of Directions.
+    """
+    expanded = []
+    for action in actions:
+        if isinstance(action, tuple):
+            expanded.extend(action)
+        else:
+            expanded.append(action)
+    return expanded
+
+
+_graphs = {}
+
+def getJunctionGraph(walls, successorTable):
+    """
+    Returns the JunctionGraph of walls, built from its successorTable the
+    first time a layout is seen in this process.
+    """
+    key = wallsKey(walls)
+    if key not in _graphs:
+        _graphs[key] = JunctionGraph(successorTable)
+    return _graphs[key]
@@ -0,0 +1,302 @@
+# nPuzzle.py
+# ----------
+# The 8 and 15 puzzles on packed integer boards, with additive pattern
+# database heuristics.
+
+
+"""
+An N-puzzle board of side s (3 for the eight puzzle, 4 for the fifteen
+puzzle) is a single int holding 4 bits per cell: the tile in cell c, with 0
+for the blank, is (board >> 4 * c) & 15.  Cells are numbered row by row
+from the top left, and the goal has tile t in cell t, as in eightpuzzle.py.
+A move slides the blank 'up', 'down', 'left' or 'right', as in
+EightPuzzleState, and costs two shifts and two additions instead of
+copying a list of lists.
+
+The heuristic is an additive pattern database: the tiles are split into
+disjoint groups, and for each group a table gives, for the cells of the
+group's tiles and of the blank, the fewest moves of that group's tiles
+needed to bring them home, whatever the other tiles do.  No move is counted
+in two groups, so the sum over the groups never overestimates, and as a move
+changes at most one group's entry by at most 1 the sum is consistent.  Each
+table is built by a retrograde breadth first search from the goal, where
+moving one of the group's tiles costs 1 and moving any other tile costs 0.
+(Keeping the blank in the index is what makes the sum consistent; taking the
+minimum over the blank's cells would not be.)  When
+NumPy is available the tables are saved to CACHE_DIRECTORY and loaded from
+there by later runs.
+
+Example:
+problem = NPuzzleSearchProblem(fromEightPuzzle(createRandomEightPuzzle()))
+search.astar(problem, patternDatabaseHeuristic)
+search.idastar(problem, patternDatabaseHeuristic)
+"""
+
+import os
+from collections import deque
+
+import search
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patternDatabases')
+UNKNOWN = 255 # Table entry for positions not reached
+
+# The tile groups of the pattern databases of each puzzle side
+DEFAULT_GROUPS = {
+    3: ((1, 2, 3, 4), (5, 6, 7, 8)),
+    4: ((1, 2, 3, 4, 5), (6, 7, 8, 9, 10), (11, 12, 13, 14, 15)),
+}
+
+def packBoard(numbers):
+    """
+    Returns the board of a list of tiles in cell order, 0 for the blank.
+    """
+    board = 0
+    for cell, tile in enumerate(numbers):
+        board |= tile << 4 * cell
+    return board
+
+
+def unpackBoard(board, side):
+    "Returns the list of tiles of a board in cell order"
+    return [(board >> 4 * cell) & 15 for cell in range(side * side)]
+
+
+def goalBoard(side):
+    return packBoard(range(side * side))
+
+
+def fromEightPuzzle(puzzle):
+    "Returns the board of an eightpuzzle.EightPuzzleState"
+    return packBoard([tile for row in puzzle.cells for tile in row])
+
+
+def getNeighbors(side):
+    """
+    Returns, for each cell, the list of (move, cell) pairs of the moves of a
+    blank in that cell.
+    """
+    neighbors = []
+    for cell in range(side * side):
+        row, col = divmod(cell, side)
+        moves = []
+        if row != 0: moves.append(('up', cell - side))
+        if row != side - 1: moves.append(('down', cell + side))
+        if col != 0: moves.append(('left', cell - 1))
+        if col != side - 1: moves.append(('right', cell + 1))
+        neighbors.append(moves)
+    return neighbors
+
+
+class PatternDatabase:
+    """
+    The additive pattern database heuristic of one puzzle side and grouping
+    of its tiles.
+    """
+
+    def __init__(self, side, groups=None, cacheDirectory=CACHE_DIRECTORY):
+        """
+        side: 3 for the eight puzzle, 4 for the fifteen puzzle
+        groups: disjoint tuples of tiles, DEFAULT_GROUPS[side] if None
+        cacheDirectory: where tables are saved, or None to always build them
+                        in memory
+        """
+        self.side = side
+        self.numCells = side * side
+        self.groups = groups or DEFAULT_GROUPS[side]
+        self.neighbors = getNeighbors(side)
+        self.tables = []
+        for group in self.groups:
+            table = None
+            path = None
+            if np is not None and cacheDirectory is not None:
+                name = 'pdb-%d-%s.npy' % (side, '-'.join([str(tile) for tile in group]))
+                path = os.path.join(cacheDirectory, name)
+                table = self._load(path, len(group))
+            if table is None:
+                table = self._compute(group)
+                if path is not None:
+                    self._save(path, table)
+            self.tables.append(table)
+        # The group of each tile, and the power of numCells it counts with
+        # in the table index of that group
+        self.tileGroups = [None] * self.numCells
+        for groupIndex, group in enumerate(self.groups):
+            for i, tile in enumerate(group):
+                self.tileGroups[tile] = (groupIndex, self.numCells ** (i + 1))
+
+    def getValue(self, board):
+        """
+        Returns the sum over the groups of the moves their tiles need.
+        """
+        indices = [0] * len(self.groups)
+        tileGroups = self.tileGroups
+        blank = 0
+        for cell in range(self.numCells):
+            tile = (board >> 4 * cell) & 15
+            if tile:
+                groupIndex, weight = tileGroups[tile]
+                indices[groupIndex] += cell * weight
+            else:
+                blank = cell
+        return sum([int(table[index + blank]) for table, index in zip(self.tables, indices)])
+
+    def _compute(self, group):
+        """
+        Returns the table of a group: with the blank in cell b and the tiles
+        of the group in cells p0, p1, ..., the fewest moves of those tiles,
+        at index b + numCells * p0 + numCells^2 * p1 + ...
+        """
+        numCells = self.numCells
+        size = numCells ** (len(group) + 1)
+        table = bytearray([UNKNOWN]) * size
+        expanded = bytearray(size)
+        weights = [numCells ** (i + 1) for i in range(len(group))]
+        start = sum([tile * weight for tile, weight in zip(group, weights)])
+        table[start] = 0
+        # A 0-1 breadth first search: states reached by a free move go to the
+        # front of the queue, so states leave it in order of distance
+        queue = deque([start])
+        neighbors = self.neighbors
+        while queue:
+            state = queue.popleft()
+            if expanded[state]:
+                continue
+            expanded[state] = 1
+            distance = table[state]
+            rest, blank = divmod(state, numCells)
+            positions = {}
+            for weight in weights:
+                rest, cell = divmod(rest, numCells)
+                positions[cell] = weight
+            for move, cell in neighbors[blank]:
+                weight = positions.get(cell)
+                if weight is None:
+                    # Another tile slides into the blank: no move of the group
+                    nextState, nextDistance = state - blank + cell, distance
+                else:
+                    # The group's tile in cell slides into the blank
+                    nextState = state + (blank - cell) * weight - blank + cell
+                    nextDistance = distance + 1
+                if nextDistance < table[nextState]:
+                    table[nextState] = nextDistance
+                    if nextDistance == distance:
+                        queue.appendleft(nextState)
+                    else:
+                        queue.append(nextState)
+        if np is None:
+            return table
+        return np.frombuffer(table, dtype=np.uint8)
+
+    def _load(self, path, groupSize):
+        if not os.path.exists(path):
+            return None
+        try:
+            table = np.load(path)
+        except (OSError, ValueError):
+            return None
+        if table.shape != (self.numCells ** (groupSize + 1),) or table.dtype != np.uint8:
+            return None
+        return table
+
+    def _save(self, path, table):
+        # Write to a temporary file first so that concurrent runs never load
+        # a partially written table.
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporaryPath = '%s.%d.tmp' % (path, os.getpid())
+            with open(temporaryPath, 'wb') as f:
+                np.save(f, table)
+            os.replace(temporaryPath, path)
+        except OSError:
+            pass
+
+
+_databases = {}
+
+def getPatternDatabase(side, groups=None, cacheDirectory=CACHE_DIRECTORY):
+    """
+    Returns the PatternDatabase of a puzzle side and grouping, building (or
+    loading) it the first time it is asked for in this process.
+    """
+    key = (side, groups or DEFAULT_GROUPS[side])
+    if key not in _databases:
+        _databases[key] = PatternDatabase(side, groups, cacheDirectory)
+    return _databases[key]
+
+
+class NPuzzleSearchProblem(search.SearchProblem):
+    """
+    The EightPuzzleSearchProblem on packed boards, for any side.  States are
+    board ints and actions are the moves of the blank.
+    """
+
+    def __init__(self, board, side=3):
+        self.start = board
+        self.side = side
+        self.goal = goalBoard(side)
+        self.neighbors = getNeighbors(side)
+        self.patternDatabase = None
+        self._expanded = 0
+
+    def getStartState(self):
+        return self.start
+
+    def isGoalState(self, state):
+        return state == self.goal
+
+    def getSuccessors(self, state):
+        """
+        Returns (board, move, 1) for each move of the blank.
+        """
+        self._expanded += 1
+        blank = findBlank(state, self.side)
+        successors = []
+        for move, cell in self.neighbors[blank]:
+            tile = (state >> 4 * cell) & 15
+            successors.append((state - (tile << 4 * cell) + (tile << 4 * blank), move, 1))
+        return successors
+
+    def getCostOfActions(self, actions):
+        """
+        Returns the number of moves, or 999999 if one of them is illegal.
+        """
+        board = self.start
+        for action in actions:
+            blank = findBlank(board, self.side)
+            cells = dict(self.neighbors[blank])
+            if action not in cells:
+                return 999999
+            tile = (board >> 4 * cells[action]) & 15
+            board = board - (tile << 4 * cells[action]) + (tile << 4 * blank)
+        return len(actions)
+
+
+def findBlank(board, side):
+    "Returns the cell of the blank"
+    cell = 0
+    while (board >> 4 * cell) & 15:
+        cell += 1
+    return cell
+
+
+def manhattanHeuristic(board, problem):
+    "The sum of the Manhattan distances of the tiles from their goal cells"
+    side = problem.side
+    total = 0
+    for cell in range(side * side):
+        tile = (board >> 4 * cell) & 15
+        if tile:
+            total += abs(cell // side - tile // side) + abs(cell % side - tile % side)
+    return total
+
+
+def patternDatabaseHeuristic(board, problem):
+    "The additive pattern database heuristic of DEFAULT_GROUPS[problem.side]"
+    if problem.patternDatabase is None:
+        problem.patternDatabase = getPatternDatabase(problem.side)
+    return problem.patternDatabase.getValue(board)
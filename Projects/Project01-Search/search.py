@@ -18,6 +18,9 @@ Pacman agents (in searchAgents.py).
 """
 
 import util
+import heapq
+from array import array
+from collections import deque
 
 class SearchProblem:
     """
@@ -159,24 +162,7 @@ def uniformCostSearch(problem: SearchProblem):
     """Search the node of least total cost first."""
     "*** YOUR CODE HERE ***"
     # util.raiseNotDefined()
-    closed = set()
-    fringe = util.PriorityQueue()
-    fringe.push(Node(problem.getStartState(), None, None), 0)
-    while not fringe.isEmpty():
-        node = fringe.pop()
-        if problem.isGoalState(node.state):
-            actions = []
-            while node.action is not None:
-                actions.append(node.action)
-                node = node.pred
-            actions.reverse()
-            return actions
-        
-        if node.state not in closed:
-            closed.add(node.state)
-            for s in problem.getSuccessors(node.state):
-                fringe.push(Node(s[0], node, s[1], s[2] + node.priority), s[2] + node.priority)
-    return []
+    return aStarSearch(problem)
     
 
 def nullHeuristic(state, problem=None):
@@ -190,33 +176,416 @@ def aStarSearch(problem: SearchProblem, heuristic=nullHeuristic):
     """Search the node that has the lowest combined cost and heuristic first."""
     "*** YOUR CODE HERE ***"
     # util.raiseNotDefined()
+    # Each state is on the fringe at most once: when a cheaper path to a
+    # queued state is found its priority is lowered with update, and
+    # best[state] holds the Node of the cheapest known path to it.  States
+    # are looked up as few times as possible, since hashing them can be
+    # expensive (e.g. the food Grid of a FoodSearchProblem state).
     closed = set()
-    fringe = util.PriorityQueue()
+    fringe = util.IndexedPriorityQueue()
     start_state = problem.getStartState()
-    fringe.push(
-        Node(start_state, None, None, heuristic(start_state, problem)), heuristic(start_state, problem)
-    )
-    
+    best = {start_state: Node(start_state, None, None, 0)}
+    fringe.push(start_state, heuristic(start_state, problem))
+
     while not fringe.isEmpty():
-        node = fringe.pop()
-        if problem.isGoalState(node.state):
+        state = fringe.pop()
+        node = best[state]
+        if problem.isGoalState(state):
             actions = []
             while node.action is not None:
                 actions.append(node.action)
                 node = node.pred
             actions.reverse()
             return actions
-        
-        if node.state not in closed:
-            closed.add(node.state)
-            for s in problem.getSuccessors(node.state):
-                fringe.push(
-                    Node(s[0], node, s[1], s[2] + node.priority), 
-                    s[2] + node.priority + heuristic(s[0], problem)
-                )
+
+        closed.add(state)
+        for s in problem.getSuccessors(state):
+            cost = node.priority + s[2]
+            known = best.get(s[0])
+            if known is None or (cost < known.priority and s[0] not in closed):
+                best[s[0]] = Node(s[0], node, s[1], cost)
+                fringe.update(s[0], cost + heuristic(s[0], problem))
+    return []
+
+def iterativeDeepeningAStarSearch(problem: SearchProblem, heuristic=nullHeuristic):
+    """
+    Depth first searches that cut off paths whose cost plus heuristic exceeds
+    a bound, starting from the heuristic of the start state and raising the
+    bound to the smallest value cut off each time.  Memory is linear in the
+    path length; states already on the current path are not revisited.
+    With a consistent heuristic the path found is optimal.
+    """
+    start = problem.getStartState()
+    bound = heuristic(start, problem)
+    path, actions, onPath = [start], [], set([start])
+
+    def boundedSearch(state, cost):
+        # Returns None once a goal is found (the path is left in actions),
+        # else the smallest cost plus heuristic that exceeded the bound
+        estimate = cost + heuristic(state, problem)
+        if estimate > bound:
+            return estimate
+        if problem.isGoalState(state):
+            return None
+        smallest = float('inf')
+        for successor, action, stepCost in problem.getSuccessors(state):
+            if successor in onPath:
+                continue
+            path.append(successor)
+            actions.append(action)
+            onPath.add(successor)
+            exceeded = boundedSearch(successor, cost + stepCost)
+            if exceeded is None:
+                return None
+            smallest = min(smallest, exceeded)
+            onPath.discard(path.pop())
+            actions.pop()
+        return smallest
+
+    while True:
+        exceeded = boundedSearch(start, 0)
+        if exceeded is None:
+            return actions
+        if exceeded == float('inf'):
+            return []
+        bound = exceeded
+
+
+class IndexedStateSpace:
+    """
+    Maps the (x,y) states of a grid search problem (a PositionSearchProblem or
+    one of its subclasses) to dense integer cell IDs derived from the walls
+    Grid of its layout: cell = x * height + y.
+    """
+    def __init__(self, walls):
+        self.width = walls.width
+        self.height = walls.height
+        self.size = walls.width * walls.height
+
+    def toIndex(self, state):
+        x, y = state
+        return int(x) * self.height + int(y)
+
+    def toState(self, index):
+        return divmod(index, self.height)
+
+def isIndexable(problem: SearchProblem):
+    """
+    Returns True if the states of problem are (x,y) positions on the problem's
+    walls Grid, i.e. if the indexed search functions below can run on it.
+    Problems opt in with a positionStates = True class attribute, as
+    PositionSearchProblem does; the shape of the start state alone cannot
+    tell a position from, say, a (cellId, foodMask) pair.
+    """
+    if not getattr(problem, 'positionStates', False) or not hasattr(problem, 'walls'):
+        return False
+    start = problem.getStartState()
+    if type(start) is not tuple or len(start) != 2:
+        return False
+    x, y = start
+    if not isinstance(x, int) or not isinstance(y, int):
+        return False
+    return 0 <= x < problem.walls.width and 0 <= y < problem.walls.height
+
+def indexedGraphSearch(problem: SearchProblem, fringeType, heuristic=None):
+    """
+    Graph search over the integer cell IDs of an IndexedStateSpace.
+
+    Instead of allocating a Node per push and keeping (x,y) tuples in a set,
+    the closed list is a bytearray and the parent pointers and back-actions
+    of closed cells live in flat array('i') buffers.  Fringe entries are
+    plain (cell, parentCell, actionCode) tuples.  The order in which states
+    are pushed, popped, goal-tested and expanded is the same as in the
+    Node-based searches above, so the returned actions and the number of
+    expanded nodes are identical.
+
+    fringeType is one of 'stack', 'queue' or 'priority'.  For 'priority' the
+    fringe is ordered by path cost plus heuristic (if given).
+    """
+    space = IndexedStateSpace(problem.walls)
+    closed = bytearray(space.size)
+    parent = array('i', [-1]) * space.size
+    backAction = array('i', [-1]) * space.size
+    actionNames, actionCodes = [], {}
+
+    def codeOf(action):
+        if action not in actionCodes:
+            actionCodes[action] = len(actionNames)
+            actionNames.append(action)
+        return actionCodes[action]
+
+    def pathTo(cell, parentCell, code):
+        if code < 0:
+            return []
+        actions = [actionNames[code]]
+        cell = parentCell
+        while backAction[cell] >= 0:
+            actions.append(actionNames[backAction[cell]])
+            cell = parent[cell]
+        actions.reverse()
+        return actions
+
+    start = problem.getStartState()
+    startEntry = (space.toIndex(start), -1, -1)
+    if fringeType == 'priority':
+        counter = 0
+        startPriority = heuristic(start, problem) if heuristic else 0
+        fringe = [(startPriority, 0, 0, startEntry)]
+        while fringe:
+            _, _, cost, entry = heapq.heappop(fringe)
+            cell = entry[0]
+            state = space.toState(cell)
+            if problem.isGoalState(state):
+                return pathTo(*entry)
+            if not closed[cell]:
+                closed[cell] = 1
+                parent[cell], backAction[cell] = entry[1], entry[2]
+                for successor, action, stepCost in problem.getSuccessors(state):
+                    nextCost = cost + stepCost
+                    priority = nextCost + heuristic(successor, problem) if heuristic else nextCost
+                    counter += 1
+                    heapq.heappush(fringe, (priority, counter, nextCost,
+                                            (space.toIndex(successor), cell, codeOf(action))))
+        return []
+
+    fringe = deque([startEntry])
+    pop = fringe.pop if fringeType == 'stack' else fringe.popleft
+    while fringe:
+        entry = pop()
+        cell = entry[0]
+        state = space.toState(cell)
+        if problem.isGoalState(state):
+            return pathTo(*entry)
+        if not closed[cell]:
+            closed[cell] = 1
+            parent[cell], backAction[cell] = entry[1], entry[2]
+            for successor, action, _ in problem.getSuccessors(state):
+                fringe.append((space.toIndex(successor), cell, codeOf(action)))
     return []
+
+def indexedDepthFirstSearch(problem: SearchProblem):
+    """
+    depthFirstSearch on integer cell IDs.  Falls back to depthFirstSearch for
+    problems whose states are not grid positions.
+    """
+    if not isIndexable(problem):
+        return depthFirstSearch(problem)
+    return indexedGraphSearch(problem, 'stack')
+
+def indexedBreadthFirstSearch(problem: SearchProblem):
+    """
+    breadthFirstSearch on integer cell IDs.  Falls back to breadthFirstSearch
+    for problems whose states are not grid positions.
+    """
+    if not isIndexable(problem):
+        return breadthFirstSearch(problem)
+    return indexedGraphSearch(problem, 'queue')
+
+def indexedUniformCostSearch(problem: SearchProblem):
+    """
+    uniformCostSearch on integer cell IDs.  Falls back to uniformCostSearch
+    for problems whose states are not grid positions.
+    """
+    if not isIndexable(problem):
+        return uniformCostSearch(problem)
+    return indexedGraphSearch(problem, 'priority')
+
+def indexedAStarSearch(problem: SearchProblem, heuristic=nullHeuristic):
+    """
+    aStarSearch on integer cell IDs.  Falls back to aStarSearch for problems
+    whose states are not grid positions.
+    """
+    if not isIndexable(problem):
+        return aStarSearch(problem, heuristic)
+    return indexedGraphSearch(problem, 'priority', heuristic)
+
+def isBidirectional(problem: SearchProblem):
+    """
+    Returns True if problem has a single goal state, problem.goal, and a
+    costFn giving the cost of entering each state, as a PositionSearchProblem
+    has, so that it can also be searched backwards from the goal.  Problems
+    whose actions move more than one cell, such as a CorridorSearchProblem,
+    set singleStepActions = False.
+    """
+    return hasattr(problem, 'goal') and hasattr(problem, 'costFn') \
+        and getattr(problem, 'singleStepActions', True)
+
+def bidirectionalGraphSearch(problem: SearchProblem, unitCost):
+    """
+    Searches forwards from the start and backwards from problem.goal at the
+    same time, always expanding the side whose cheapest fringe entry is
+    cheaper, until no path through the unexpanded states can beat the best
+    path found where the two searches met.  With unitCost every step costs
+    1, as in breadth first search.
+
+    Moves are assumed to be reversible, as on a Pacman grid: the states
+    before a state are its successors, and going back along a move is the
+    Actions.reverseDirection of it.  Backwards, the step from p into c costs
+    problem.costFn(c).  Both directions count in problem._expanded.
+    """
+    from game import Actions
+    start, goal = problem.getStartState(), problem.goal
+    if problem.isGoalState(start):
+        return []
+    # cost[side][state], and link[side][state] = (state one step further
+    # from that side's root, forward action between them)
+    cost = [{start: 0}, {goal: 0}]
+    link = [{start: None}, {goal: None}]
+    fringes = [[(0, 0, start)], [(0, 0, goal)]]
+    closed = [set(), set()]
+    counter = 0
+    best, meeting = float('inf'), None
+    while fringes[0] and fringes[1]:
+        if fringes[0][0][0] + fringes[1][0][0] >= best:
+            break
+        side = 0 if fringes[0][0][0] <= fringes[1][0][0] else 1
+        stateCost, _, state = heapq.heappop(fringes[side])
+        if state in closed[side]:
+            continue
+        closed[side].add(state)
+        for successor, action, stepCost in problem.getSuccessors(state):
+            if side == 1:
+                action = Actions.reverseDirection(action)
+                stepCost = problem.costFn(state)
+            nextCost = stateCost + (1 if unitCost else stepCost)
+            if nextCost < cost[side].get(successor, float('inf')):
+                cost[side][successor] = nextCost
+                link[side][successor] = (state, action)
+                counter += 1
+                heapq.heappush(fringes[side], (nextCost, counter, successor))
+                other = cost[1 - side].get(successor)
+                if other is not None and nextCost + other < best:
+                    best, meeting = nextCost + other, successor
+    if meeting is None:
+        return []
+
+    actions = []
+    state = meeting
+    while link[0][state] is not None:
+        state, action = link[0][state]
+        actions.append(action)
+    actions.reverse()
+    state = meeting
+    while link[1][state] is not None:
+        state, action = link[1][state]
+        actions.append(action)
+    return actions
+
+def bidirectionalBreadthFirstSearch(problem: SearchProblem):
+    """
+    breadthFirstSearch from both ends of a single-goal position problem.
+    Falls back to breadthFirstSearch for other problems.
+    """
+    if not isBidirectional(problem):
+        return breadthFirstSearch(problem)
+    return bidirectionalGraphSearch(problem, True)
+
+def bidirectionalUniformCostSearch(problem: SearchProblem):
+    """
+    uniformCostSearch from both ends of a single-goal position problem.
+    Falls back to uniformCostSearch for other problems.
+    """
+    if not isBidirectional(problem):
+        return uniformCostSearch(problem)
+    return bidirectionalGraphSearch(problem, False)
+
+class NearestGoalField:
+    """
+    Shortest paths from the cells of a grid to the nearest of a set of goal
+    cells, kept up to date lazily as goals are removed (dots are eaten).
+
+    successorTable maps each open cell to its ((nextCell, action), ...)
+    moves, as searchAgents.getSuccessorTable builds it.  A cell's link
+    (distance, goal, nextCell, action) is known while its goal is still a
+    goal: goals are only ever removed, so a known distance stays exact.
+    pathFrom(position) searches breadth first from position through the
+    cells that are not known, stopping as soon as no cell further away can
+    beat the best known cell found so far plus its distance.  The cells on
+    the path found are linked on the way back.
+
+    removeGoal(goal) only forgets the goal; the links that led to it are
+    repaired when a later search runs into them.  self.expanded counts the
+    cells expanded so far.
+    """
+    def __init__(self, successorTable, goals):
+        self.successorTable = successorTable
+        self.goals = set(goals)
+        self.links = dict((goal, (0, goal, None, None)) for goal in self.goals)
+        self.expanded = 0
+
+    def _knownLink(self, cell):
+        link = self.links.get(cell)
+        if link is not None and link[1] in self.goals:
+            return link
+        return None
+
+    def _search(self, position):
+        """
+        Makes the link of position known.  Returns False if no goal can be
+        reached from it.
+        """
+        if self._knownLink(position) is not None:
+            return True
+        parents = {position: None} # Cell -> (parent, action from the parent)
+        frontier, level = [position], 0
+        best = None # (distance from position, cell, known neighbor, action)
+        while frontier and (best is None or level + 1 < best[0]):
+            nextFrontier = []
+            for cell in frontier:
+                self.expanded += 1
+                for nextCell, action in self.successorTable[cell]:
+                    link = self._knownLink(nextCell)
+                    if link is not None:
+                        if best is None or level + 1 + link[0] < best[0]:
+                            best = (level + 1 + link[0], cell, nextCell, action)
+                    elif nextCell not in parents:
+                        parents[nextCell] = (cell, action)
+                        nextFrontier.append(nextCell)
+            frontier, level = nextFrontier, level + 1
+        if best is None:
+            return False
+        _, cell, nextCell, action = best
+        distance, goal = self.links[nextCell][0] + 1, self.links[nextCell][1]
+        while True:
+            self.links[cell] = (distance, goal, nextCell, action)
+            if parents[cell] is None:
+                return True
+            nextCell = cell
+            cell, action = parents[cell]
+            distance += 1
+
+    def getDistance(self, position):
+        if not self._search(position):
+            return float('inf')
+        return self.links[position][0]
+
+    def pathFrom(self, position):
+        """
+        Returns (actions, goal): a shortest path from position to the nearest
+        goal, and that goal, or ([], None) if no goal can be reached.
+        """
+        if not self._search(position):
+            return [], None
+        actions = []
+        distance, goal, nextCell, action = self.links[position]
+        while distance > 0:
+            actions.append(action)
+            distance, goal, nextCell, action = self.links[nextCell]
+        return actions, goal
+
+    def removeGoal(self, goal):
+        "Stops treating goal as a goal"
+        self.goals.discard(goal)
+
 # Abbreviations 
 bfs = breadthFirstSearch
 dfs = depthFirstSearch
 astar = aStarSearch
 ucs = uniformCostSearch
+ibfs = indexedBreadthFirstSearch
+idfs = indexedDepthFirstSearch
+bibfs = bidirectionalBreadthFirstSearch
+biucs = bidirectionalUniformCostSearch
+iastar = indexedAStarSearch
+idastar = iterativeDeepeningAStarSearch
+iucs = indexedUniformCostSearch
@@ -42,6 +42,9 @@ import util
 import time
 import search
 import pacman
+from distanceOracle import getMazeDistanceOracle, UNREACHABLE
+from foodHeuristicEngine import getFoodHeuristicEngine
+from junctionGraph import getJunctionGraph, expandActions
 
 class GoWestAgent(Agent):
     "An agent that goes West until it can't."
@@ -53,6 +56,35 @@ class GoWestAgent(Agent):
         else:
             return Directions.STOP
 
+SUCCESSOR_TABLE_CACHE = {}
+
+def getSuccessorTable(walls):
+    """
+    Returns a dictionary mapping every open (x,y) cell of the walls Grid to a
+    tuple of ((nextx, nexty), action) pairs, one for each legal move out of
+    that cell, in the order North, South, East, West.
+
+    The table is built once per layout (keyed on the walls Grid) and shared by
+    every search problem on that layout, so getSuccessors never has to call
+    Actions.directionToVector or probe the walls.
+    """
+    if walls in SUCCESSOR_TABLE_CACHE:
+        return SUCCESSOR_TABLE_CACHE[walls]
+    table = {}
+    for x in range(walls.width):
+        for y in range(walls.height):
+            if walls[x][y]: continue
+            moves = []
+            for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
+                dx, dy = Actions.directionToVector(action)
+                nextx, nexty = int(x + dx), int(y + dy)
+                if 0 <= nextx < walls.width and 0 <= nexty < walls.height \
+                        and not walls[nextx][nexty]:
+                    moves.append(((nextx, nexty), action))
+            table[(x, y)] = tuple(moves)
+    SUCCESSOR_TABLE_CACHE[walls.copy()] = table
+    return table
+
 #######################################################
 # This portion is written for you, but will only work #
 #       after you fill in parts of search.py          #
@@ -147,6 +179,7 @@ class PositionSearchProblem(search.SearchProblem):
 
     Note: this search problem is fully specified; you should NOT change it.
     """
+    positionStates = True # States are (x,y) cells of self.walls; see search.isIndexable
 
     def __init__(self, gameState, costFn = lambda x: 1, goal=(1,1), start=None, warn=True, visualize=True):
         """
@@ -157,6 +190,7 @@ class PositionSearchProblem(search.SearchProblem):
         goal: A position in the gameState
         """
         self.walls = gameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startState = gameState.getPacmanPosition()
         if start != None: self.startState = start
         self.goal = goal
@@ -196,15 +230,9 @@ class PositionSearchProblem(search.SearchProblem):
          cost of expanding to that successor
         """
 
-        successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x,y = state
-            dx, dy = Actions.directionToVector(action)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextState = (nextx, nexty)
-                cost = self.costFn(nextState)
-                successors.append( ( nextState, action, cost) )
+        costFn = self.costFn
+        successors = [(nextState, action, costFn(nextState))
+                      for nextState, action in self.successorTable[state]]
 
         # Bookkeeping for display purposes
         self._expanded += 1 # DO NOT CHANGE
@@ -266,6 +294,62 @@ def euclideanHeuristic(position, problem, info={}):
     xy2 = problem.goal
     return ( (xy1[0] - xy2[0]) ** 2 + (xy1[1] - xy2[1]) ** 2 ) ** 0.5
 
+class CorridorSearchProblem(PositionSearchProblem):
+    """
+    A PositionSearchProblem searched over the junctions of the layout's
+    JunctionGraph instead of over every cell: each successor is the far end
+    of a corridor (or the start or goal, if they lie in one), reached by a
+    tuple of Directions.  Search functions therefore return a list of tuples,
+    which junctionGraph.expandActions turns back into Directions.
+
+    _expanded counts junctions expanded, so it can be compared with the
+    cells expanded by a PositionSearchProblem.
+
+    Steps cost the cells they cross, so uniformCostSearch and aStarSearch find
+    shortest paths.  breadthFirstSearch and depthFirstSearch ignore step
+    costs: breadthFirstSearch here finds the path with the fewest corridors,
+    which is legal but not necessarily the shortest.
+    """
+    singleStepActions = False
+
+    def __init__(self, gameState, costFn = lambda x: 1, goal=(1,1), start=None, warn=True, visualize=True):
+        PositionSearchProblem.__init__(self, gameState, costFn, goal, start, warn, visualize)
+        self.junctionGraph = getJunctionGraph(self.walls, self.successorTable)
+        self.stops = self.junctionGraph.getStops([self.startState, self.goal])
+
+    def getSuccessors(self, state):
+        """
+        Returns (junction, actions, cost) triples for the corridors out of
+        state, where cost is the sum of costFn over the cells entered.
+        """
+        costFn = self.costFn
+        successors = [(target, actions, sum([costFn(cell) for cell in cells]))
+                      for target, actions, cells, _ in self.junctionGraph.getEdges(state, self.stops)]
+
+        # Bookkeeping for display purposes
+        self._expanded += 1 # DO NOT CHANGE
+        if state not in self._visited:
+            self._visited[state] = True
+            self._visitedlist.append(state)
+
+        return successors
+
+    def getCostOfActions(self, actions):
+        if actions == None: return 999999
+        return PositionSearchProblem.getCostOfActions(self, expandActions(actions))
+
+class CorridorSearchAgent(SearchAgent):
+    """
+    A SearchAgent for the CorridorSearchProblem, which follows the Directions
+    of the path found over junctions.
+    """
+    def __init__(self, fn='uniformCostSearch', heuristic='nullHeuristic'):
+        SearchAgent.__init__(self, fn, 'CorridorSearchProblem', heuristic)
+
+    def registerInitialState(self, state):
+        SearchAgent.registerInitialState(self, state)
+        self.actions = expandActions(self.actions)
+
 #####################################################
 # This portion is incomplete.  Time to write code!  #
 #####################################################
@@ -282,6 +366,7 @@ class CornersProblem(search.SearchProblem):
         Stores the walls, pacman's starting position and corners.
         """
         self.walls = startingGameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startingPosition = startingGameState.getPacmanPosition()
         top, right = self.walls.height-2, self.walls.width-2
         self.corners = ((1,1), (1,top), (right, 1), (right, top))
@@ -325,26 +410,21 @@ class CornersProblem(search.SearchProblem):
         """
 
         successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            # Add a successor state to the successor list if the action is legal
-            # Here's a code snippet for figuring out whether a new position hits a wall:
-            #   x,y = currentPosition
-            #   dx, dy = Actions.directionToVector(action)
-            #   nextx, nexty = int(x + dx), int(y + dy)
-            #   hitsWall = self.walls[nextx][nexty]
-
-            "*** YOUR CODE HERE ***"
-            x, y = state[0]
-            dx, dy = Actions.directionToVector(action)
-            nextx, nexty = int(x + dx), int(y + dy)
-            hitswall = self.walls[nextx][nexty]
-            if not hitswall:
+        # The legal moves out of every open cell are precomputed in
+        # self.successorTable (see getSuccessorTable), so no wall lookups or
+        # direction vectors are needed here.
+
+        "*** YOUR CODE HERE ***"
+        for nextPosition, action in self.successorTable[state[0]]:
+            if nextPosition in self.corners:
                 boolean = []
                 for i in range(len(self.corners)):
-                    value = ((nextx, nexty) == self.corners[i]) or state[i+1]
+                    value = (nextPosition == self.corners[i]) or state[i+1]
                     boolean.append(value)
-                state_next = ((nextx, nexty), boolean[0], boolean[1], boolean[2], boolean[3])
-                successors.append((state_next, action, 1))
+                state_next = (nextPosition, boolean[0], boolean[1], boolean[2], boolean[3])
+            else:
+                state_next = (nextPosition,) + state[1:]
+            successors.append((state_next, action, 1))
         self._expanded += 1 # DO NOT CHANGE
         return successors
 
@@ -407,6 +487,7 @@ class FoodSearchProblem:
     def __init__(self, startingGameState: pacman.GameState):
         self.start = (startingGameState.getPacmanPosition(), startingGameState.getFood())
         self.walls = startingGameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startingGameState = startingGameState
         self._expanded = 0 # DO NOT CHANGE
         self.heuristicInfo = {} # A dictionary for the heuristic to store information
@@ -421,14 +502,10 @@ class FoodSearchProblem:
         "Returns successor states, the actions they require, and a cost of 1."
         successors = []
         self._expanded += 1 # DO NOT CHANGE
-        for direction in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x,y = state[0]
-            dx, dy = Actions.directionToVector(direction)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextFood = state[1].copy()
-                nextFood[nextx][nexty] = False
-                successors.append( ( ((nextx, nexty), nextFood), direction, 1) )
+        for (nextx, nexty), direction in self.successorTable[state[0]]:
+            nextFood = state[1].copy()
+            nextFood[nextx][nexty] = False
+            successors.append( ( ((nextx, nexty), nextFood), direction, 1) )
         return successors
 
     def getCostOfActions(self, actions):
@@ -452,18 +529,6 @@ class AStarFoodSearchAgent(SearchAgent):
         self.searchType = FoodSearchProblem
 
 
-class NewState:
-    def __init__(self, state, walls):
-        self.state = state
-        self.walls = walls
-    
-    def getWalls(self):
-        return self.walls
-    
-    def getPacmanPosition(self):
-        return self.state[0]
-    
-    
 def foodHeuristic(state: Tuple[Tuple, List[List]], problem: FoodSearchProblem):
     """
     Your heuristic for the FoodSearchProblem goes here.
@@ -495,15 +560,88 @@ def foodHeuristic(state: Tuple[Tuple, List[List]], problem: FoodSearchProblem):
     position, foodGrid = state
     "*** YOUR CODE HERE ***"
     # return 0
-    heuristic_value = 0
-    for i in range(foodGrid.height):
-        for j in range(foodGrid.width):
-            if foodGrid[j][i]:
-                heuristic_value = max(heuristic_value, 
-                                      mazeDistance((j,i), position, NewState(state, problem.walls))
-                                      )
-    return heuristic_value
+    # max(farthest food, nearest food + MST of the food) in maze distances,
+    # see foodHeuristicEngine.py
+    engine = getFoodHeuristicEngine(problem)
+    return engine.getValue(position, engine.getFoodMask(foodGrid))
     
+class CompactFoodSearchProblem(FoodSearchProblem):
+    """
+    The FoodSearchProblem with compact states.
+
+    The open cells are numbered as in the layout's MazeDistanceOracle and the
+    starting food in foodGrid.asList() order.  A search state is a tuple
+    ( cellId, foodMask ) of two ints, where bit i of foodMask is set while
+    food i is left, so a successor clears at most one bit and states hash as
+    ints instead of walking a Grid.  getGridState translates a state back to
+    ( pacmanPosition, foodGrid ) for code written for FoodSearchProblem.
+    """
+    positionStates = False # ( cellId, foodMask ) is not an (x,y) cell; see search.isIndexable
+
+    def __init__(self, startingGameState: pacman.GameState):
+        FoodSearchProblem.__init__(self, startingGameState)
+        oracle = getMazeDistanceOracle(self.walls)
+        self.cells = oracle.cells
+        self.foods = startingGameState.getFood().asList()
+        foodBits = dict((food, 1 << i) for i, food in enumerate(self.foods))
+        # compactSuccessors[cellId]: ( nextCellId, action, food bit of nextCellId or 0 ) for each move
+        self.compactSuccessors = [tuple((oracle.getCellId(nextCell), action, foodBits.get(nextCell, 0))
+                                        for nextCell, action in self.successorTable[cell])
+                                  for cell in self.cells]
+        self.start = (oracle.getCellId(startingGameState.getPacmanPosition()), (1 << len(self.foods)) - 1)
+
+    def isGoalState(self, state):
+        return state[1] == 0
+
+    def getSuccessors(self, state):
+        "Returns successor states, the actions they require, and a cost of 1."
+        self._expanded += 1 # DO NOT CHANGE
+        mask = state[1]
+        return [((nextCell, mask & ~bit), action, 1) for nextCell, action, bit in self.compactSuccessors[state[0]]]
+
+    def getPosition(self, state):
+        return self.cells[state[0]]
+
+    def getGridState(self, state):
+        """
+        Returns the FoodSearchProblem state ( pacmanPosition, foodGrid ) of a
+        compact state.
+        """
+        foodGrid = self.startingGameState.getFood().copy()
+        for i, (x, y) in enumerate(self.foods):
+            foodGrid[x][y] = bool(state[1] >> i & 1)
+        return (self.getPosition(state), foodGrid)
+
+    def getCostOfActions(self, actions):
+        """Returns the cost of a particular sequence of actions.  If those actions
+        include an illegal move, return 999999"""
+        x, y = self.getPosition(self.start)
+        cost = 0
+        for action in actions:
+            dx, dy = Actions.directionToVector(action)
+            x, y = int(x + dx), int(y + dy)
+            if self.walls[x][y]:
+                return 999999
+            cost += 1
+        return cost
+
+def compactFoodHeuristic(state, problem: CompactFoodSearchProblem):
+    "foodHeuristic for CompactFoodSearchProblem states, read straight from the food mask"
+    return getFoodHeuristicEngine(problem).getValue(problem.getPosition(state), state[1])
+
+def gridStateHeuristic(heuristic):
+    """
+    Adapts a FoodSearchProblem heuristic, such as foodHeuristic, to
+    CompactFoodSearchProblem states with CompactFoodSearchProblem.getGridState.
+    """
+    return lambda state, problem: heuristic(problem.getGridState(state), problem)
+
+class AStarCompactFoodSearchAgent(SearchAgent):
+    "A SearchAgent for CompactFoodSearchProblem using A* and compactFoodHeuristic"
+    def __init__(self):
+        self.searchFunction = lambda prob: search.aStarSearch(prob, compactFoodHeuristic)
+        self.searchType = CompactFoodSearchProblem
+
 class ClosestDotSearchAgent(SearchAgent):
     "Search for all food using a sequence of searches"
     def registerInitialState(self, state):
@@ -534,16 +672,36 @@ class ClosestDotSearchAgent(SearchAgent):
 
         "*** YOUR CODE HERE ***"
         # util.raiseNotDefined()
-        cost = 1000000000
-        opt = []
-        for i in range(food.width):
-            for j in range(food.height):
-                if food[i][j]:
-                    path = search.bfs(problem)
-                    if len(path)<cost:
-                        opt = path
-                        cost = len(path)
-        return path
+        # One breadth first search stops at whichever dot is closest
+        return search.bfs(problem)
+
+class IncrementalClosestDotSearchAgent(ClosestDotSearchAgent):
+    """
+    Eats the closest dot again and again like the ClosestDotSearchAgent, but
+    instead of a new breadth first search per dot it keeps one
+    search.NearestGoalField over all the food, whose searches stop at cells
+    whose path to a dot is already known.
+    """
+    def registerInitialState(self, state):
+        starttime = time.time()
+        self.actions = []
+        currentState = state
+        field = search.NearestGoalField(getSuccessorTable(state.getWalls()), state.getFood().asList())
+        while(currentState.getFood().count() > 0):
+            nextPathSegment, dot = field.pathFrom(currentState.getPacmanPosition())
+            if dot is None:
+                raise Exception('No dot can be reached from %s' % str(currentState.getPacmanPosition()))
+            self.actions += nextPathSegment
+            for action in nextPathSegment:
+                legal = currentState.getLegalActions()
+                if action not in legal:
+                    t = (str(action), str(currentState))
+                    raise Exception('NearestGoalField returned an illegal move: %s!\n%s' % t)
+                currentState = currentState.generateSuccessor(0, action)
+            field.removeGoal(dot)
+        self.actionIndex = 0
+        print('Path found with cost %d in %.1f seconds' % (len(self.actions), time.time() - starttime))
+        print('Cells expanded: %d' % field.expanded)
 
 class AnyFoodSearchProblem(PositionSearchProblem):
     """
@@ -567,6 +725,7 @@ class AnyFoodSearchProblem(PositionSearchProblem):
 
         # Store info for the PositionSearchProblem (no need to change this)
         self.walls = gameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startState = gameState.getPacmanPosition()
         self.costFn = lambda x: 1
         self._visited, self._visitedlist, self._expanded = {}, [], 0 # DO NOT CHANGE
@@ -591,11 +750,18 @@ def mazeDistance(point1: Tuple[int, int], point2: Tuple[int, int], gameState: pa
     Example usage: mazeDistance( (2,4), (5,6), gameState)
 
     This might be a useful helper function for your ApproximateSearchAgent.
+
+    Distances come from the layout's MazeDistanceOracle (distanceOracle.py),
+    so after the first call on a layout each call is a table lookup.  As with
+    the length of a breadth first search that finds no path, points with no
+    path between them are 0 apart (not the oracle's UNREACHABLE).
     """
     x1, y1 = point1
     x2, y2 = point2
     walls = gameState.getWalls()
     assert not walls[x1][y1], 'point1 is a wall: ' + str(point1)
     assert not walls[x2][y2], 'point2 is a wall: ' + str(point2)
-    prob = PositionSearchProblem(gameState, start=point1, goal=point2, warn=False, visualize=False)
-    return len(search.bfs(prob))
+    distance = getMazeDistanceOracle(walls).getDistance(point1, point2)
+    if distance == UNREACHABLE:
+        return 0
+    return distance
@@ -684,6 +684,51 @@ class ClosestDotTest(testClasses.TestCase):
 
 
 
+class MazeDistanceTest(testClasses.TestCase):
+
+    def __init__(self, question, testDict):
+        super(MazeDistanceTest, self).__init__(question, testDict)
+        self.layoutText = testDict['layout']
+        self.layoutName = testDict['layoutName']
+        self.pairs = [tuple(map(int, line.split())) for line in testDict['pairs'].strip().split('\n')]
+
+    def solution(self, searchAgents):
+        lay = layout.Layout([l.strip() for l in self.layoutText.split('\n')])
+        gameState = pacman.GameState()
+        gameState.initialize(lay, 0)
+        return [searchAgents.mazeDistance((x1, y1), (x2, y2), gameState) for x1, y1, x2, y2 in self.pairs]
+
+    def execute(self, grades, moduleDict, solutionDict):
+        searchAgents = moduleDict['searchAgents']
+        gold_distances = [int(distance) for distance in solutionDict['distances'].split()]
+        distances = self.solution(searchAgents)
+
+        if distances != gold_distances:
+            grades.addMessage('FAIL: %s' % self.path)
+            grades.addMessage('\tpacman layout:\t\t%s' % self.layoutName)
+            grades.addMessage('\tpairs:\t\t%s' % self.pairs)
+            grades.addMessage('\tstudent distances:\t\t%s' % distances)
+            grades.addMessage('\tcorrect distances:\t\t%s' % gold_distances)
+            return False
+
+        grades.addMessage('PASS: %s' % self.path)
+        grades.addMessage('\tpacman layout:\t\t%s' % self.layoutName)
+        grades.addMessage('\tdistances:\t\t%s' % distances)
+        return True
+
+    def writeSolution(self, moduleDict, filePath):
+        searchAgents = moduleDict['searchAgents']
+        # open file and write comments
+        handle = open(filePath, 'w')
+        handle.write('# This is the solution file for %s.\n' % self.path)
+        distances = self.solution(searchAgents)
+        handle.write('distances: "%s"\n' % ' '.join([str(distance) for distance in distances]))
+        handle.close()
+        return True
+
+
+
+
 class CornerHeuristicSanity(testClasses.TestCase):
 
     def __init__(self, question, testDict):
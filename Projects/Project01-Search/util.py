@@ -205,6 +205,68 @@ class PriorityQueue:
         else:
             self.push(item, priority)
 
+class IndexedPriorityQueue:
+    """
+      Implements a priority queue that, unlike PriorityQueue, can lower the
+      priority of an item that is already in the queue without scanning and
+      re-heapifying the whole heap.
+
+      The heap holds [priority, count, item] entries and a dictionary maps
+      every queued item to its live entry.  update invalidates the old entry
+      in O(1) and pushes a new one in O(log n); invalidated entries are
+      skipped when they reach the top of the heap.  Items must be hashable and
+      each item is in the queue at most once.  Ties between equal priorities
+      are broken first-in-first-out; an item whose priority is lowered by
+      update is ordered as if it had just been pushed.
+    """
+    REMOVED = object()
+
+    def  __init__(self):
+        self.heap = []
+        self.entries = {}
+        self.count = 0
+
+    def push(self, item, priority):
+        "Adds item with the given priority; the same as update if item is already queued"
+        if item in self.entries:
+            self.update(item, priority)
+            return
+        entry = [priority, self.count, item]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
+        self.count += 1
+
+    def pop(self):
+        "Removes and returns the item with the lowest priority"
+        while True:
+            (_, _, item) = heapq.heappop(self.heap)
+            if item is not IndexedPriorityQueue.REMOVED:
+                del self.entries[item]
+                return item
+
+    def isEmpty(self):
+        return len(self.entries) == 0
+
+    def update(self, item, priority):
+        # If item already in priority queue with higher priority, invalidate its entry and push it again.
+        # If item already in priority queue with equal or lower priority, do nothing.
+        # If item not in priority queue, do the same thing as self.push.
+        entry = self.entries.get(item)
+        if entry is not None:
+            if entry[0] <= priority:
+                return
+            entry[2] = IndexedPriorityQueue.REMOVED
+        entry = [priority, self.count, item]
+        self.entries[item] = entry
+        heapq.heappush(self.heap, entry)
+        self.count += 1
+
+    def __contains__(self, item):
+        return item in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
 class PriorityQueueWithFunction(PriorityQueue):
     """
     Implements a priority queue with the same push/pop signature of the
@@ -0,0 +1,484 @@
+# benchmark.py
+# ------------
+# Micro-benchmarks for the game engine of the multi-agent project.  They are
+# not part of the autograder.
+
+
+"""
+Times the parts of game.py and pacman.py that game tree search agents spend
+their time in.
+
+Run a benchmark by name, for example:
+
+> python benchmark.py successors -l minimaxClassic,mediumClassic
+> python benchmark.py expectimax -d 3
+> python benchmark.py gameLoop -g 20
+> python benchmark.py bench --report baseline.json
+> python benchmark.py bench --baseline baseline.json
+
+Use 'python benchmark.py --help' for the list of benchmarks and options.
+"""
+
+import optparse
+import sys
+import time
+
+import layout
+from game import Grid, BitGrid
+from pacman import GameState, ExploredStateCounter
+
+
+def timed(function, *args):
+    "Returns (result, seconds) for function(*args)"
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def rate(operations, seconds):
+    "Formats a throughput in operations per second"
+    if seconds <= 0:
+        return '%12s' % 'inf'
+    return '%12.0f' % (operations / seconds)
+
+
+def loadLayout(name, foodGridClass=Grid):
+    lay = layout.getLayout(name, foodGridClass=foodGridClass)
+    if lay == None:
+        raise Exception("The layout " + name + " cannot be found")
+    return lay
+
+
+def initialState(lay, foodGridClass=None):
+    state = GameState()
+    state.initialize(lay, lay.getNumGhosts(), foodGridClass)
+    return state
+
+########################
+# GameState successors #
+########################
+
+
+def _expandTree(state, depth):
+    """
+    Generates every successor of the game tree below state, one ply per agent
+    move, down to depth plies.  Returns the number of successors generated.
+    """
+    numAgents = state.getNumAgents()
+    layer = [state]
+    generated = 0
+    for ply in range(depth):
+        agentIndex = ply % numAgents
+        nextLayer = []
+        for parent in layer:
+            for action in parent.getLegalActions(agentIndex):
+                child = parent.generateSuccessor(agentIndex, action)
+                generated += 1
+                if not (child.isWin() or child.isLose()):
+                    nextLayer.append(child)
+        layer = nextLayer
+    return generated
+
+
+SUCCESSOR_MODES = [
+    # name, food grid class, GameState.copyOnWrite
+    ('Grid', Grid, False),
+    ('BitGrid', BitGrid, False),
+    ('Grid+cow', Grid, True),
+    ('BitGrid+cow', BitGrid, True),
+]
+
+
+def benchmarkSuccessors(options):
+    """
+    Compares GameState.generateSuccessor throughput with the food stored in a
+    Grid or a BitGrid, with and without copy-on-write successors.  The full
+    game tree of each layout is expanded to a fixed number of plies.  With
+    --explored every state is also counted by an ExploredStateCounter, as the
+    autograder does.
+    """
+    depth = options.depth or 8
+    print('%-16s %-12s %5s %10s %12s %8s' %
+          ('layout', 'mode', 'plies', 'nodes', 'nodes/s', 'speedup'))
+    copyOnWrite = GameState.copyOnWrite
+    for name in options.layouts:
+        lay = loadLayout(name)
+        baseline = None
+        for mode, foodGridClass, GameState.copyOnWrite in SUCCESSOR_MODES:
+            state = initialState(lay, foodGridClass)
+            if options.explored:
+                GameState.setExploredCounter(ExploredStateCounter())
+            generated, seconds = timed(_expandTree, state, depth)
+            GameState.setExploredCounter(None)
+            if baseline == None:
+                baseline = seconds
+            print('%-16s %-12s %5d %10d %s %7.2fx' % (name, mode, depth,
+                                                     generated, rate(generated, seconds), baseline / seconds))
+            sys.stdout.flush()
+    GameState.copyOnWrite = copyOnWrite
+
+
+#######################
+# Memoized expectimax #
+#######################
+
+
+def benchmarkExpectimax(options):
+    """
+    Plays the opening moves of a game on each layout with ExpectimaxAgent
+    choosing pacman's moves and seeded random ghosts.  At every pacman move
+    MemoizedExpectimaxAgent, with per-move and with cross-move caches,
+    searches the same state, must pick the same action, and is timed
+    against it.
+    """
+    import random
+    import multiAgents
+    depth = str(options.depth or 3)
+    print('%-16s %-24s %5s %9s %8s %10s %10s' %
+          ('layout', 'agent', 'moves', 'seconds', 'speedup', 'value hit', 'eval hit'))
+    for name in options.layouts:
+        lay = loadLayout(name)
+        agents = [('ExpectimaxAgent', multiAgents.ExpectimaxAgent(depth=depth)),
+                  ('Memoized, per move', multiAgents.MemoizedExpectimaxAgent(depth=depth)),
+                  ('Memoized, LRU 100000', multiAgents.MemoizedExpectimaxAgent(depth=depth, cacheSize='100000'))]
+        seconds = [0.0 for agent in agents]
+        rng = random.Random(options.seed)
+        state = initialState(lay)
+        moves = 0
+        while moves < options.moves and not (state.isWin() or state.isLose()):
+            actions = []
+            for i, (agentName, agent) in enumerate(agents):
+                action, time = timed(agent.getAction, state)
+                actions.append(action)
+                seconds[i] += time
+            if len(set(actions)) != 1:
+                raise Exception('Memoized expectimax chose %s instead of %s' %
+                                (actions[1:], actions[0]))
+            moves += 1
+            state = state.generateSuccessor(0, actions[0])
+            for ghostIndex in range(1, state.getNumAgents()):
+                if state.isWin() or state.isLose():
+                    break
+                state = state.generateSuccessor(
+                    ghostIndex, rng.choice(state.getLegalActions(ghostIndex)))
+        for i, (agentName, agent) in enumerate(agents):
+            if hasattr(agent, 'getHitRates'):
+                hitRates = '%9.1f%% %9.1f%%' % tuple(
+                    [100 * rate for rate in agent.getHitRates()])
+            else:
+                hitRates = '%10s %10s' % ('-', '-')
+            print('%-16s %-24s %5d %9.2f %7.2fx %s' % (name, agentName, moves,
+                                                      seconds[i], seconds[0] / seconds[i], hitRates))
+            sys.stdout.flush()
+
+
+#############
+# Game loop #
+#############
+
+
+def _playGames(lay, options, trusted):
+    """
+    Plays options.games games between a GreedyAgent and random ghosts with
+    NullGraphics, seeding the random module before each one.  Returns the
+    move histories and the number of moves.
+    """
+    import random
+    import pacmanAgents
+    import ghostAgents
+    import textDisplay
+    from pacman import ClassicGameRules
+    rules = ClassicGameRules()
+    histories = []
+    for i in range(options.games):
+        random.seed(options.seed + i)
+        ghosts = [ghostAgents.RandomGhost(i + 1) for i in range(lay.getNumGhosts())]
+        game = rules.newGame(lay, pacmanAgents.GreedyAgent(), ghosts, textDisplay.NullGraphics(),
+                             True, False, trusted)
+        game.run()
+        histories.append(game.moveHistory)
+    return histories, sum([len(history) for history in histories])
+
+
+def benchmarkGameLoop(options):
+    """
+    Compares the moves per second of Game.run, which hands every agent deep
+    copies of the state, with Game.runTrusted, which hands them the state
+    itself.  Cheap agents are used so that the loop, not the search, is
+    timed.  Both loops must play the same games.
+    """
+    print('%-16s %-8s %5s %8s %12s %8s' %
+          ('layout', 'loop', 'games', 'moves', 'moves/s', 'speedup'))
+    for name in options.layouts:
+        lay = loadLayout(name)
+        (histories, moves), seconds = timed(_playGames, lay, options, False)
+        (trustedHistories, trustedMoves), trustedSeconds = timed(_playGames, lay, options, True)
+        if trustedHistories != histories:
+            raise Exception('Game.runTrusted played different games on ' + name)
+        print('%-16s %-8s %5d %8d %s %7.2fx' % (name, 'run', options.games, moves,
+                                               rate(moves, seconds), 1.0))
+        print('%-16s %-8s %5d %8d %s %7.2fx' % (name, 'trusted', options.games, trustedMoves,
+                                               rate(trustedMoves, trustedSeconds), seconds / trustedSeconds))
+        sys.stdout.flush()
+
+
+#########################
+# Search agent benchmark #
+#########################
+
+
+class SearchCounters:
+    """
+    Counts, while installed, the GameState.getLegalActions calls (one per
+    node a search agent expands), the GameState.generateSuccessor calls and
+    the calls of an agent's evaluation function.
+    """
+
+    def __init__(self):
+        self.nodes = 0
+        self.successors = 0
+        self.evaluations = 0
+
+    def install(self, agent):
+        counters = self
+        self.getLegalActions = GameState.getLegalActions
+        self.generateSuccessor = GameState.generateSuccessor
+        self.agent = agent
+        self.evaluationFunction = evaluationFunction = agent.evaluationFunction
+
+        def getLegalActions(state, agentIndex=0):
+            counters.nodes += 1
+            return counters.getLegalActions(state, agentIndex)
+
+        def generateSuccessor(state, agentIndex, action):
+            counters.successors += 1
+            return counters.generateSuccessor(state, agentIndex, action)
+
+        def countedEvaluationFunction(*args):
+            counters.evaluations += 1
+            return evaluationFunction(*args)
+        GameState.getLegalActions = getLegalActions
+        GameState.generateSuccessor = generateSuccessor
+        agent.evaluationFunction = countedEvaluationFunction
+
+    def uninstall(self):
+        GameState.getLegalActions = self.getLegalActions
+        GameState.generateSuccessor = self.generateSuccessor
+        self.agent.evaluationFunction = self.evaluationFunction
+
+
+def maxResidentKilobytes():
+    "Returns the memory high-water mark of this process, or None where unknown"
+    try:
+        import resource
+    except ImportError:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return maxrss // 1024 if sys.platform == 'darwin' else maxrss
+
+
+BENCH_FIELDS = ['agent', 'depth', 'layout', 'seed', 'moves', 'nodes', 'successors', 'evaluations',
+                'seconds', 'secondsPerMove', 'maxSecondsPerMove', 'maxResidentKB']
+# The fields compared with a baseline and what makes them a regression
+BENCH_CHECKS = [('nodes', 'more nodes expanded'), ('successors', 'more successors generated'),
+                ('evaluations', 'more evaluations'), ('secondsPerMove', 'slower moves'),
+                ('maxResidentKB', 'more memory')]
+
+
+def benchRun(agentName, depth, lay, layoutName, seed, options):
+    """
+    Plays the opening options.moves pacman moves of a game with agentName
+    searching to depth against seeded random ghosts, and returns a row of
+    BENCH_FIELDS.
+    """
+    import random
+    import multiAgents
+    agent = getattr(multiAgents, agentName)(depth=str(depth))
+    rng = random.Random(seed)
+    random.seed(seed)
+    state = initialState(lay)
+    counters = SearchCounters()
+    moveSeconds = []
+    while len(moveSeconds) < options.moves and not (state.isWin() or state.isLose()):
+        counters.install(agent)
+        try:
+            action, seconds = timed(agent.getAction, state)
+        finally:
+            counters.uninstall()
+        moveSeconds.append(seconds)
+        state = state.generateSuccessor(0, action)
+        for ghostIndex in range(1, state.getNumAgents()):
+            if state.isWin() or state.isLose():
+                break
+            state = state.generateSuccessor(
+                ghostIndex, rng.choice(state.getLegalActions(ghostIndex)))
+    return {'agent': agentName, 'depth': depth, 'layout': layoutName, 'seed': seed,
+            'moves': len(moveSeconds), 'nodes': counters.nodes, 'successors': counters.successors,
+            'evaluations': counters.evaluations, 'seconds': sum(moveSeconds),
+            'secondsPerMove': sum(moveSeconds) / max(len(moveSeconds), 1),
+            'maxSecondsPerMove': max(moveSeconds + [0.0]), 'maxResidentKB': maxResidentKilobytes()}
+
+
+def writeReport(rows, path):
+    "Writes rows to path as CSV if it ends in .csv and as JSON otherwise"
+    if path.endswith('.csv'):
+        import csv
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, BENCH_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        import json
+        with open(path, 'w') as f:
+            json.dump({'fields': BENCH_FIELDS, 'rows': rows}, f, indent=1)
+
+
+def readReport(path):
+    "Reads the rows of a report written by writeReport"
+    if path.endswith('.csv'):
+        import csv
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            for field in BENCH_FIELDS[1:]:
+                if field != 'layout' and row[field] not in ('', None):
+                    row[field] = float(row[field]) if '.' in row[field] else int(row[field])
+        return rows
+    import json
+    with open(path) as f:
+        return json.load(f)['rows']
+
+
+def findRegressions(rows, baselineRows, tolerance):
+    """
+    Returns a message for every field of BENCH_CHECKS that grew by more than
+    tolerance (a fraction) over the baseline row of the same agent, depth,
+    layout and seed.  Rows without a baseline row are skipped.
+    """
+    def key(row):
+        return (row['agent'], int(row['depth']), row['layout'], int(row['seed']))
+    baseline = dict([(key(row), row) for row in baselineRows])
+    regressions = []
+    for row in rows:
+        if key(row) not in baseline:
+            continue
+        old = baseline[key(row)]
+        if row['moves'] != old['moves']:
+            regressions.append('%s depth %d on %s, seed %d: %d moves instead of %d' %
+                               (key(row) + (row['moves'], old['moves'])))
+            continue
+        for field, problem in BENCH_CHECKS:
+            if row[field] is None or old[field] in (None, ''):
+                continue
+            if row[field] > old[field] * (1 + tolerance):
+                regressions.append('%s depth %d on %s, seed %d: %s (%s %s, baseline %s)' %
+                                   (key(row) + (problem, field, formatField(row[field]),
+                                                formatField(old[field]))))
+    return regressions
+
+
+def formatField(value):
+    return '%.4f' % value if isinstance(value, float) else str(value)
+
+
+def benchmarkBench(options):
+    """
+    Runs every agent of --agents at every depth of --depths on every layout
+    for --numSeeds seeds, counting nodes expanded, successors generated and
+    evaluations, and timing every move.  The memory column is the high-water
+    mark of the whole process so far.  --report saves the rows as JSON or
+    CSV, and --baseline compares them with a saved report: any count, time
+    per move or memory more than --tolerance above it is reported as a
+    regression and the exit status is 1.
+    """
+    rows = []
+    print('%-16s %5s %-16s %5s %5s %9s %10s %10s %9s %9s %8s' %
+          ('agent', 'depth', 'layout', 'seed', 'moves', 'nodes', 'successors', 'evaluations',
+           's/move', 'max s', 'max KB'))
+    for layoutName in options.layouts:
+        lay = loadLayout(layoutName)
+        for agentName in options.agents:
+            for depth in options.depths:
+                for seed in range(options.seed, options.seed + options.numSeeds):
+                    row = benchRun(agentName, depth, lay, layoutName, seed, options)
+                    rows.append(row)
+                    print('%-16s %5d %-16s %5d %5d %9d %10d %10d %9.4f %9.4f %8s' %
+                          (agentName, depth, layoutName, seed, row['moves'], row['nodes'],
+                           row['successors'], row['evaluations'], row['secondsPerMove'],
+                           row['maxSecondsPerMove'], row['maxResidentKB']))
+                    sys.stdout.flush()
+    if options.report:
+        writeReport(rows, options.report)
+        print('Wrote %d rows to %s' % (len(rows), options.report))
+    if options.baseline:
+        regressions = findRegressions(rows, readReport(options.baseline), options.tolerance)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        print('%d regressions against %s' % (len(regressions), options.baseline))
+        if regressions:
+            return 1
+    return 0
+
+
+DEFAULT_LAYOUTS = {
+    'bench': 'minimaxClassic,smallClassic,mediumClassic,trappedClassic',
+    'expectimax': 'smallClassic,trappedClassic',
+    'gameLoop': 'smallClassic,mediumClassic,originalClassic',
+    'successors': 'minimaxClassic,mediumClassic',
+}
+
+BENCHMARKS = {
+    'bench': benchmarkBench,
+    'expectimax': benchmarkExpectimax,
+    'gameLoop': benchmarkGameLoop,
+    'successors': benchmarkSuccessors,
+}
+
+
+def readCommand(argv):
+    usageStr = """
+    USAGE:      python benchmark.py <benchmark> <options>
+    BENCHMARKS: %s
+    """ % ', '.join(sorted(BENCHMARKS))
+    parser = optparse.OptionParser(usageStr)
+    parser.add_option('-l', '--layouts', dest='layouts', default=None,
+                      help='comma separated layout names (the default depends on the benchmark, '
+                      'see DEFAULT_LAYOUTS)')
+    parser.add_option('-d', '--depth', dest='depth', type='int', default=None,
+                      help='plies to expand for successors (default 8), search depth for expectimax (default 3)')
+    parser.add_option('-m', '--moves', dest='moves', type='int', default=10,
+                      help='pacman moves to play for expectimax and bench (default %default)')
+    parser.add_option('-g', '--games', dest='games', type='int', default=10,
+                      help='games to play for gameLoop (default %default)')
+    parser.add_option('-s', '--seed', dest='seed', type='int', default=188,
+                      help='random seed (default %default)')
+    parser.add_option('-n', '--numSeeds', dest='numSeeds', type='int', default=2,
+                      help='seeds to play from --seed on for bench (default %default)')
+    parser.add_option('--agents', dest='agents', default='MinimaxAgent,AlphaBetaAgent,ExpectimaxAgent',
+                      help='comma separated multiAgents.py agents for bench (default %default)')
+    parser.add_option('--depths', dest='depths', default='1,2,3',
+                      help='comma separated search depths for bench (default %default)')
+    parser.add_option('--report', dest='report', default=None,
+                      help='file to write the bench rows to, CSV if it ends in .csv and JSON otherwise')
+    parser.add_option('--baseline', dest='baseline', default=None,
+                      help='bench report to compare with, flagging regressions')
+    parser.add_option('--tolerance', dest='tolerance', type='float', default=0.25,
+                      help='growth over the baseline that is a regression, as a fraction (default %default)')
+    parser.add_option('-e', '--explored', action='store_true', dest='explored', default=False,
+                      help='count explored states while expanding')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1 or args[0] not in BENCHMARKS:
+        parser.error('pick one benchmark from: ' +
+                     ', '.join(sorted(BENCHMARKS)))
+    if options.layouts == None:
+        options.layouts = DEFAULT_LAYOUTS[args[0]]
+    options.layouts = options.layouts.split(',')
+    options.agents = options.agents.split(',')
+    options.depths = [int(depth) for depth in options.depths.split(',')]
+    return BENCHMARKS[args[0]], options
+
+
+if __name__ == '__main__':
+    benchmark, options = readCommand(sys.argv[1:])
+    sys.exit(benchmark(options))
@@ -0,0 +1,242 @@
+# evaluationFeatures.py
+# ---------------------
+# Vectorized, cached GameState features for evaluation functions.
+
+
+"""
+The features that evaluation functions compute over and over: distances
+from pacman to the food, the capsules and the ghosts, and counts of them.
+
+getFeatures(state) returns the StateFeatures of a GameState.  The food and
+capsule coordinates are kept in NumPy arrays when NumPy is available, so a
+feature over all the food is a single vectorized expression.  Work is cached
+at three levels:
+
+ - the food and capsule coordinates, by the food and capsules of the state,
+ - the distances from pacman to them, by that and pacman's position,
+ - the StateFeatures themselves, by the Zobrist key of the state,
+
+each together with the layout.
+
+Sibling leaves of a search tree, which differ only in where a ghost moved,
+therefore share all the food work.  Maze distances are read from an all
+pairs distance matrix built once per layout (see Layout.getMazeDistances).
+
+Example:
+features = getFeatures(currentGameState)
+features.nearestFood(maze=True) - 2 * features.foodWithin(3)
+"""
+
+import collections
+from util import nearestPoint
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CACHE_SIZE = 100000 # Entries kept in each cache, least recently used first out
+
+_stateCache = collections.OrderedDict()
+_boardCache = collections.OrderedDict()
+_distanceCache = collections.OrderedDict()
+
+
+def _cached(cache, key, compute, *args):
+    "Returns cache[key], filling it with compute(*args) and evicting the oldest entry"
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = cache[key] = compute(*args)
+    if len(cache) > CACHE_SIZE:
+        cache.popitem(last=False)
+    return value
+
+
+def getFeatures(state):
+    """
+    Returns the StateFeatures of a GameState.
+    """
+    key = (state.data.layout.key, state.getZobristKey())
+    return _cached(_stateCache, key, StateFeatures, state)
+
+
+def clearCaches():
+    _stateCache.clear()
+    _boardCache.clear()
+    _distanceCache.clear()
+
+
+def boardKey(data):
+    """
+    Returns the Zobrist key of the food and capsules of a GameStateData: its
+    incremental key with the agents' parts XORed out.
+    """
+    key = data.zobrist
+    for agentIndex in range(len(data.agentStates)):
+        key ^= data.getAgentZobristKey(agentIndex)
+    return key
+
+
+class MazeMatrix:
+    """
+    The maze distances of a layout, the matrix of layout.computeMazeDistances
+    indexed by cell ID, with float('inf') for cells with no path between them.
+    """
+
+    def __init__(self, layout):
+        self.cellIds, self.distances = layout.getMazeDistances()
+
+    def getCellIds(self, positions):
+        cellIds = [self.cellIds[position] for position in positions]
+        return np.array(cellIds, dtype=int) if np is not None else cellIds
+
+    def getDistances(self, position, cellIds):
+        row = self.distances[self.cellIds[position]]
+        if np is not None:
+            return row[cellIds]
+        return [row[cell] for cell in cellIds]
+
+
+def getMazeMatrix(layout):
+    return layout.getDerivedData('mazeMatrix', MazeMatrix)
+
+
+class Targets:
+    """
+    A fixed set of (x,y) cells, such as the food of a state, with their
+    coordinates and, when maze distances are asked for, their cell IDs.
+    """
+
+    def __init__(self, positions, layout):
+        self.positions = positions
+        self.layout = layout
+        self.cellIds = None
+        if np is not None:
+            self.coordinates = np.array(positions, dtype=int).reshape((len(positions), 2))
+
+    def __len__(self):
+        return len(self.positions)
+
+    def getDistances(self, position, maze=False):
+        """
+        Returns the Manhattan (or maze) distances from position to each cell.
+        """
+        if maze:
+            matrix = getMazeMatrix(self.layout)
+            if self.cellIds is None:
+                self.cellIds = matrix.getCellIds(self.positions)
+            return matrix.getDistances(position, self.cellIds)
+        x, y = position
+        if np is not None:
+            return np.abs(self.coordinates[:, 0] - x) + np.abs(self.coordinates[:, 1] - y)
+        return [abs(fx - x) + abs(fy - y) for fx, fy in self.positions]
+
+
+class BoardFeatures:
+    """
+    The food and capsules of a state, shared by every state with the same.
+    """
+
+    def __init__(self, data):
+        self.food = Targets(data.food.asList(), data.layout)
+        self.capsules = Targets(list(data.capsules), data.layout)
+
+
+class StateFeatures:
+    """
+    Distance and count features of a GameState.  Ghost positions between
+    grid points are rounded to the nearest one for maze distances.
+
+    The nearest* methods return default when there is nothing to measure to.
+    """
+
+    def __init__(self, state):
+        data = state.data
+        self.layout = data.layout
+        self.boardKey = (self.layout.key, boardKey(data))
+        self.board = _cached(_boardCache, self.boardKey, BoardFeatures, data)
+        self.pacmanPosition = state.getPacmanPosition()
+        ghostStates = state.getGhostStates()
+        self.ghostPositions = [ghostState.getPosition() for ghostState in ghostStates]
+        self.scaredTimers = [ghostState.scaredTimer for ghostState in ghostStates]
+        self.ghostDistances = {}
+
+    def numFood(self):
+        return len(self.board.food)
+
+    def numCapsules(self):
+        return len(self.board.capsules)
+
+    def foodDistances(self, maze=False):
+        """
+        Returns the distances from pacman to each food, an array with NumPy.
+        """
+        key = (self.boardKey, self.pacmanPosition, 'food', maze)
+        return _cached(_distanceCache, key, self.board.food.getDistances, self.pacmanPosition, maze)
+
+    def capsuleDistances(self, maze=False):
+        key = (self.boardKey, self.pacmanPosition, 'capsules', maze)
+        return _cached(_distanceCache, key, self.board.capsules.getDistances, self.pacmanPosition, maze)
+
+    def nearestFood(self, maze=False, default=None):
+        return _nearest(self.foodDistances(maze), default)
+
+    def sumFood(self, maze=False):
+        "Returns the sum of the distances from pacman to each food"
+        return _total(self.foodDistances(maze))
+
+    def foodWithin(self, radius, maze=False):
+        "Returns the number of food within radius moves of pacman"
+        return _countWithin(self.foodDistances(maze), radius)
+
+    def nearestCapsule(self, maze=False, default=None):
+        return _nearest(self.capsuleDistances(maze), default)
+
+    def getGhostDistances(self, maze=False):
+        """
+        Returns the list of distances from pacman to each ghost, in agent order.
+        """
+        if maze not in self.ghostDistances:
+            if maze:
+                matrix = getMazeMatrix(self.layout)
+                cells = matrix.getCellIds([nearestPoint(position) for position in self.ghostPositions])
+                distances = [float(d) for d in matrix.getDistances(self.pacmanPosition, cells)]
+            else:
+                x, y = self.pacmanPosition
+                distances = [abs(gx - x) + abs(gy - y) for gx, gy in self.ghostPositions]
+            self.ghostDistances[maze] = distances
+        return self.ghostDistances[maze]
+
+    def nearestGhost(self, maze=False, scared=False, default=None):
+        """
+        Returns the distance to the nearest ghost that is not scared, or with
+        scared=True to the nearest scared ghost.
+        """
+        distances = [distance for distance, timer in zip(self.getGhostDistances(maze), self.scaredTimers)
+                     if (timer > 0) == scared]
+        return min(distances) if distances else default
+
+    def ghostsWithin(self, radius, maze=False, scared=False):
+        return len([distance for distance, timer in zip(self.getGhostDistances(maze), self.scaredTimers)
+                    if (timer > 0) == scared and distance <= radius])
+
+
+def _nearest(distances, default):
+    if len(distances) == 0:
+        return default
+    if np is not None:
+        return distances.min().item()
+    return min(distances)
+
+
+def _total(distances):
+    if np is not None:
+        return distances.sum().item()
+    return sum(distances)
+
+
+def _countWithin(distances, radius):
+    if np is not None:
+        return int(np.count_nonzero(distances <= radius))
+    return len([distance for distance in distances if distance <= radius])
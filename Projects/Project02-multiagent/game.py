@@ -25,6 +25,13 @@ import time
 import os
 import traceback
 import sys
+import struct
+import hashlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 #######################
 # Parts worth reading #
@@ -205,18 +212,16 @@ class Grid:
     def __eq__(self, other):
         if other == None:
             return False
+        if isinstance(other, BitGrid):
+            return other == self
         return self.data == other.data
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        # The hash of the int with bit x * height + y set for each true cell,
+        # read most significant bit first from the last cell
+        bits = ''.join(['1' if cell else '0'
+                        for column in reversed(self.data) for cell in reversed(column)])
+        return hash(int(bits, 2) if bits else 0)
 
     def copy(self):
         g = Grid(self.width, self.height)
@@ -247,22 +252,29 @@ class Grid:
         Returns an efficient int list representation
 
         (width, height, bitPackedInts...)
+
+        Cells are taken in _cellIndexToPosition order, CELLS_PER_INT cells to an
+        int with the first cell in the most significant bit.  The last int is
+        zero padded, and is all padding when the cells fill every other int.
+        """
+        numInts = self.width * self.height // self.CELLS_PER_INT + 1
+        packed = _packCells(self.data, numInts * self.CELLS_PER_INT)
+        return (self.width, self.height) + tuple(
+            _splitInt(packed, numInts, self.CELLS_PER_INT))
+
+    def packBytes(self):
         """
-        bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
-        return tuple(bits)
+        Returns a compact bytes representation, for recording games
+
+        The width and height as big-endian 16 bit ints, followed by one bit per
+        cell in packBits order, zero padded to a whole byte.
+        """
+        numBytes = (self.width * self.height + 7) // 8
+        packed = _packCells(self.data, numBytes * 8)
+        return struct.pack('>HH', self.width, self.height) + packed.to_bytes(numBytes, 'big')
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -270,14 +282,14 @@ class Grid:
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
         for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height:
-                    break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
+            if packed < 0:
+                raise ValueError("must be a positive integer")
+            if packed >> self.CELLS_PER_INT:
+                raise ValueError("must fit in CELLS_PER_INT bits")
+        packed = _joinInts(bits, self.CELLS_PER_INT)
+        self.data = _unpackCells(
+            packed, len(bits) * self.CELLS_PER_INT, self.width, self.height)
 
     def _unpackInt(self, packed, size):
         bools = []
@@ -294,11 +306,232 @@ class Grid:
 
 
 def reconstituteGrid(bitRep):
+    """
+    Rebuilds a Grid from its packBits tuple or packBytes bytes.  Anything else
+    is assumed to be a Grid already and returned unchanged.
+    """
+    if type(bitRep) is bytes:
+        width, height = struct.unpack('>HH', bitRep[:4])
+        grid = Grid(width, height)
+        body = bitRep[4:]
+        grid.data = _unpackCells(int.from_bytes(
+            body, 'big'), len(body) * 8, width, height)
+        return grid
     if type(bitRep) is not type((1, 2)):
         return bitRep
     width, height = bitRep[:2]
     return Grid(width, height, bitRepresentation=bitRep[2:])
 
+# The packed forms of a Grid all read its cells, column by column, as one
+# big-endian bit string.  These helpers convert between the list of columns
+# and that bit string held in a single int, vectorized with NumPy when it is
+# available.
+
+
+def _packCells(data, numBits):
+    "Returns the cells of a list of columns as a numBits int, zero padded on the right"
+    numCells = sum([len(column) for column in data])
+    if np is not None:
+        cells = np.array(data, dtype=bool).ravel()
+        packed = int.from_bytes(np.packbits(cells).tobytes(), 'big')
+        paddedCells = (numCells + 7) // 8 * 8
+    else:
+        bits = ''.join(['1' if cell else '0'
+                        for column in data for cell in column])
+        packed = int(bits, 2) if bits else 0
+        paddedCells = numCells
+    if numBits >= paddedCells:
+        return packed << numBits - paddedCells
+    return packed >> paddedCells - numBits
+
+
+def _unpackCells(packed, numBits, width, height):
+    "Returns the list of columns whose cells are the first bits of a numBits int"
+    numCells = width * height
+    if numBits < numCells:
+        packed <<= numCells - numBits
+        numBits = numCells
+    if np is not None:
+        numBytes = (numBits + 7) // 8
+        body = np.frombuffer((packed << numBytes * 8 - numBits).to_bytes(
+            numBytes, 'big'), dtype=np.uint8)
+        cells = np.unpackbits(body, count=numCells).astype(bool)
+        return cells.reshape(width, height).tolist()
+    bits = format(packed >> numBits - numCells,
+                  '0%db' % numCells) if numCells else ''
+    return [[bit == '1' for bit in bits[x * height:(x + 1) * height]] for x in range(width)]
+
+
+def _splitInt(packed, numInts, size):
+    "Splits a numInts * size bit int into numInts ints of size bits, most significant first"
+    mask = (1 << size) - 1
+    return [(packed >> (numInts - i - 1) * size) & mask for i in range(numInts)]
+
+
+def _joinInts(ints, size):
+    "Concatenates ints of size bits into one int, the first in the most significant bits"
+    packed = 0
+    for value in ints:
+        packed = (packed << size) | value
+    return packed
+
+
+class BitGrid:
+    """
+    A boolean Grid backed by a single Python int.  Cell (x,y) is bit
+    x * height + y, the same cell order Grid.__hash__ uses, so a BitGrid and a
+    Grid with the same cells hash alike.
+
+    Data is read and written via grid[x][y] as with Grid, through a small
+    column proxy.  Because ints are immutable, copy() shares the bits and is
+    O(1); a write replaces the int of the grid written to only.  count() is a
+    popcount and hashing and equality work on the int directly.
+    """
+
+    def __init__(self, width, height, initialValue=False, bitRepresentation=None):
+        if initialValue not in [False, True]:
+            raise Exception('BitGrids can only contain booleans')
+        self.width = width
+        self.height = height
+        self.bits = (1 << width * height) - 1 if initialValue else 0
+        if bitRepresentation:
+            self._unpackBits(bitRepresentation)
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.width:
+            raise IndexError('BitGrid column index out of range')
+        return BitGridColumn(self, i * self.height)
+
+    def __iter__(self):
+        for x in range(self.width):
+            yield BitGridColumn(self, x * self.height)
+
+    def __len__(self):
+        return self.width
+
+    def __str__(self):
+        out = [[str(self[x][y])[0] for x in range(self.width)]
+               for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None:
+            return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.height == other.height \
+                and self.width == other.width
+        return self.asGrid() == other
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        g = BitGrid(self.width, self.height)
+        g.bits = self.bits
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        return self.copy()
+
+    def count(self, item=True):
+        ones = _popcount(self.bits)
+        if item:
+            return ones
+        return self.width * self.height - ones
+
+    def asList(self, key=True):
+        bits = self.bits
+        if not key:
+            bits = ~bits & ((1 << self.width * self.height) - 1)
+        list = []
+        height = self.height
+        while bits:
+            lowest = bits & -bits
+            list.append(divmod(lowest.bit_length() - 1, height))
+            bits ^= lowest
+        return list
+
+    def asGrid(self):
+        """
+        Returns a list of lists Grid with the same cells.
+        """
+        g = Grid(self.width, self.height)
+        for x, y in self.asList():
+            g.data[x][y] = True
+        return g
+
+    def packBits(self):
+        """
+        Returns the same (width, height, bitPackedInts...) representation as
+        Grid.packBits
+        """
+        return self.asGrid().packBits()
+
+    def _unpackBits(self, bits):
+        g = Grid(self.width, self.height, bitRepresentation=bits)
+        self.bits = toBitGrid(g).bits
+
+
+class BitGridColumn:
+    """
+    The column x of a BitGrid, returned by grid[x] so that grid[x][y] works.
+    """
+    __slots__ = ('grid', 'offset')
+
+    def __init__(self, grid, offset):
+        self.grid = grid
+        self.offset = offset
+
+    def __getitem__(self, y):
+        if not 0 <= y < self.grid.height:
+            raise IndexError('BitGrid row index out of range')
+        return (self.grid.bits >> self.offset + y) & 1 == 1
+
+    def __setitem__(self, y, value):
+        if not 0 <= y < self.grid.height:
+            raise IndexError('BitGrid row index out of range')
+        if value:
+            self.grid.bits |= 1 << self.offset + y
+        else:
+            self.grid.bits &= ~(1 << self.offset + y)
+
+    def __iter__(self):
+        for y in range(self.grid.height):
+            yield self[y]
+
+    def __len__(self):
+        return self.grid.height
+
+
+def _popcount(n):
+    return bin(n).count('1')
+
+
+if hasattr(int, 'bit_count'):  # Python 3.10+
+    _popcount = int.bit_count
+
+
+def toBitGrid(grid):
+    """
+    Returns a BitGrid with the cells of a Grid (or a copy of a BitGrid).
+    """
+    if isinstance(grid, BitGrid):
+        return grid.copy()
+    g = BitGrid(grid.width, grid.height)
+    bits = 0
+    index = 0
+    for column in grid.data:
+        for cell in column:
+            if cell:
+                bits |= 1 << index
+            index += 1
+    g.bits = bits
+    return g
+
 ####################################
 # Parts you shouldn't have to read #
 ####################################
@@ -369,6 +602,75 @@ class Actions:
 
     getPossibleActions = staticmethod(getPossibleActions)
 
+    def getGhostActions(possible, direction):
+        """
+        Filters the possible actions of a ghost heading in direction: ghosts
+        cannot stop, and cannot turn around unless they reach a dead end.
+        """
+        possible = [action for action in possible if action != Directions.STOP]
+        reverse = Actions.reverseDirection(direction)
+        if reverse in possible and len(possible) > 1:
+            possible.remove(reverse)
+        return possible
+    getGhostActions = staticmethod(getGhostActions)
+
+    # id(walls) -> (walls, tables) for getActionTables
+    _actionTables = {}
+
+    def getActionTables(walls):
+        """
+        Returns (pacmanActions, ghostActions) for a walls Grid.  For the cell
+        (x,y), with cell index x * walls.height + y, pacmanActions[cell] is
+        the tuple of getPossibleActions on that grid point and
+        ghostActions[cell][direction] the tuple of legal actions of a ghost
+        heading in direction there.  The tables are built once per walls
+        Grid, which must not change afterwards.
+        """
+        entry = Actions._actionTables.get(id(walls))
+        if entry is not None and entry[0] is walls:
+            return entry[1]
+        pacmanActions, ghostActions = [], []
+        for x in range(walls.width):
+            for y in range(walls.height):
+                if walls[x][y]:
+                    pacmanActions.append(())
+                    ghostActions.append({})
+                    continue
+                possible = Actions.getPossibleActions(Configuration((x, y), Directions.STOP), walls)
+                pacmanActions.append(tuple(possible))
+                ghostActions.append(dict([(direction, tuple(Actions.getGhostActions(possible, direction)))
+                                          for direction in Actions._directions]))
+        tables = (pacmanActions, ghostActions)
+        # Keep a reference to walls so that its id cannot be reused while cached
+        Actions._actionTables[id(walls)] = (walls, tables)
+        return tables
+    getActionTables = staticmethod(getActionTables)
+
+    def getLegalActions(config, walls):
+        """
+        Returns the list of getPossibleActions, from the action table of
+        walls when config is on a grid point.
+        """
+        x, y = config.pos
+        x_int, y_int = int(x), int(y)
+        if x_int == x and y_int == y:
+            return list(Actions.getActionTables(walls)[0][x_int * walls.height + y_int])
+        return Actions.getPossibleActions(config, walls)
+    getLegalActions = staticmethod(getLegalActions)
+
+    def getLegalGhostActions(config, walls):
+        """
+        Returns the legal actions of a ghost with configuration config, from
+        the action table of walls when the ghost is on a grid point.
+        Scared ghosts move at half speed and can be between grid points.
+        """
+        x, y = config.pos
+        x_int, y_int = int(x), int(y)
+        if x_int == x and y_int == y:
+            return list(Actions.getActionTables(walls)[1][x_int * walls.height + y_int][config.direction])
+        return Actions.getGhostActions(Actions.getPossibleActions(config, walls), config.direction)
+    getLegalGhostActions = staticmethod(getLegalGhostActions)
+
     def getLegalNeighbors(position, walls):
         x, y = position
         x_int, y_int = int(x + 0.5), int(y + 0.5)
@@ -395,17 +697,30 @@ class Actions:
 
 class GameStateData:
 
-    def __init__(self, prevState=None):
+    def __init__(self, prevState=None, copyOnWrite=False):
         """
         Generates a new data packet by copying information from its predecessor.
+
+        With copyOnWrite the food grid, the capsule list and the AgentStates
+        are shared with the predecessor rather than copied.  Code that changes
+        one of them must then first replace it with a copy of its own, as the
+        rules in pacman.py do.
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates(prevState.agentStates)
+            if copyOnWrite:
+                self.food = prevState.food
+                self.capsules = prevState.capsules
+                self.agentStates = prevState.agentStates[:]
+            else:
+                self.food = prevState.food.shallowCopy()
+                self.capsules = prevState.capsules[:]
+                self.agentStates = self.copyAgentStates(prevState.agentStates)
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self.zobrist = prevState.zobrist
+        else:
+            self.zobrist = 0
 
         self._foodEaten = None
         self._foodAdded = None
@@ -452,13 +767,49 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        return hash(self.getZobristKey())
+
+    def fingerprint(self):
+        """
+        Returns a 64 bit int that, up to hash collisions, tells apart any two
+        states that __eq__ tells apart.
+        """
+        return self.getZobristKey()
+
+    def getZobristKey(self):
+        """
+        Returns the 64 bit Zobrist key of the state: the XOR of a random key
+        for each agent's configuration and scared timer, each food and
+        capsule and the score.  Equal states have equal keys.
+
+        The rules in pacman.py keep self.zobrist (every part but the score)
+        up to date as they change the state, so this takes O(1) time.
+        """
+        return self.zobrist ^ zobristKey('score', self.score)
+
+    def getAgentZobristKey(self, agentIndex):
+        """
+        Returns the part of the Zobrist key for an agent's configuration and
+        scared timer.  Code that changes an AgentState XORs it out of
+        self.zobrist before the change and back in after it.
+        """
+        agentState = self.agentStates[agentIndex]
+        x, y = agentState.configuration.pos
+        return zobristKey('agent', agentIndex, x, y, agentState.configuration.direction) ^ \
+            zobristKey('scared', agentIndex, agentState.scaredTimer)
+
+    def computeZobristKey(self):
+        """
+        Computes self.zobrist from scratch.
+        """
+        key = 0
+        for agentIndex in range(len(self.agentStates)):
+            key ^= self.getAgentZobristKey(agentIndex)
+        for x, y in self.food.asList():
+            key ^= zobristKey('food', x, y)
+        for x, y in self.capsules:
+            key ^= zobristKey('capsule', x, y)
+        return key
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
@@ -514,11 +865,19 @@ class GameStateData:
             return '3'
         return 'E'
 
-    def initialize(self, layout, numGhostAgents):
+    def initialize(self, layout, numGhostAgents, foodGridClass=None):
         """
         Creates an initial game state from a layout array (see layout.py).
+
+        foodGridClass overrides the class of the layout's food grid, for
+        example BitGrid to use a bitboard for the food of every successor.
         """
-        self.food = layout.food.copy()
+        if foodGridClass == BitGrid:
+            self.food = toBitGrid(layout.food)
+        elif foodGridClass == Grid and isinstance(layout.food, BitGrid):
+            self.food = layout.food.asGrid()
+        else:
+            self.food = layout.food.copy()
         #self.capsules = []
         self.capsules = layout.capsules[:]
         self.layout = layout
@@ -536,6 +895,25 @@ class GameStateData:
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
         self._eaten = [False for a in self.agentStates]
+        self.zobrist = self.computeZobristKey()
+
+
+ZOBRIST_KEYS = {}
+
+
+def zobristKey(*feature):
+    """
+    Returns the random 64 bit key of a feature of a game state, such as
+    ('food', x, y).  Keys are derived from the feature itself, so they are
+    the same in every process, and ints and equal floats share a key.
+    """
+    key = ZOBRIST_KEYS.get(feature)
+    if key is None:
+        text = repr(tuple([float(v) if type(v) is int else v for v in feature]))
+        key = int.from_bytes(hashlib.blake2b(
+            text.encode(), digest_size=8).digest(), 'big')
+        ZOBRIST_KEYS[feature] = key
+    return key
 
 
 try:
@@ -550,7 +928,8 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False):
+    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False,
+                 trusted=False):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -559,6 +938,7 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.trusted = trusted
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
@@ -605,6 +985,8 @@ class Game:
         """
         Main control loop for game play.
         """
+        if self.trusted and not self.catchExceptions:
+            return self.runTrusted()
         self.display.initialize(self.state.data)
         self.numMoves = 0
 
@@ -620,6 +1002,9 @@ class Game:
                 self.unmute()
                 self._agentCrash(i, quiet=True)
                 return
+            # tell anytime agents how long they may think about a move
+            if 'setMoveTimeout' in dir(agent):
+                agent.setMoveTimeout(self.rules.getMoveTimeout(i))
             if ("registerInitialState" in dir(agent)):
                 self.mute(i)
                 if self.catchExceptions:
@@ -729,7 +1114,9 @@ class Game:
                     self.unmute()
                     return
             else:
+                start_time = time.time()
                 action = agent.getAction(observation)
+                self.totalAgentTimes[agentIndex] += time.time() - start_time
             self.unmute()
 
             # Execute the action
@@ -776,3 +1163,82 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def runTrusted(self):
+        """
+        The control loop for agents that are trusted not to change the states
+        they are given, meant for headless (NullGraphics) runs.  Agents get
+        the game's own GameState instead of a deep copy, which also copies the
+        food and re-parses the layout, and there is no muting of output.
+        Timeouts and exception handling come with catchExceptions, so run()
+        only uses this loop when catchExceptions is off.
+
+        After each agent call the state is checked against what it was before
+        (see _checkUnchanged), so an agent that changes the agents, food,
+        capsules or score of a state it was given through the GameState and
+        AgentState methods, or replaces its food or agent states, stops the
+        game with an exception.  Changes to the walls or the layout, and
+        changes made to the food Grid directly, are not detected.
+        """
+        self.display.initialize(self.state.data)
+        self.numMoves = 0
+        agents = self.agents
+        for i, agent in enumerate(agents):
+            if not agent:
+                print("Agent %d failed to load" % i, file=sys.stderr)
+                self._agentCrash(i, quiet=True)
+                return
+            if hasattr(agent, 'setMoveTimeout'):
+                agent.setMoveTimeout(self.rules.getMoveTimeout(i))
+            if hasattr(agent, 'registerInitialState'):
+                snapshot = self._snapshot()
+                start_time = time.time()
+                agent.registerInitialState(self.state)
+                self.totalAgentTimes[i] += time.time() - start_time
+                self._checkUnchanged(i, snapshot)
+        observers = [hasattr(agent, 'observationFunction') for agent in agents]
+
+        agentIndex = self.startingIndex
+        numAgents = len(agents)
+        while not self.gameOver:
+            agent = agents[agentIndex]
+            snapshot = self._snapshot()
+            start_time = time.time()
+            if observers[agentIndex]:
+                action = agent.getAction(agent.observationFunction(self.state))
+            else:
+                action = agent.getAction(self.state)
+            self.totalAgentTimes[agentIndex] += time.time() - start_time
+            self._checkUnchanged(agentIndex, snapshot)
+
+            self.moveHistory.append((agentIndex, action))
+            self.state = self.state.generateSuccessor(agentIndex, action)
+            self.display.update(self.state.data)
+            self.rules.process(self.state, self)
+            agentIndex = (agentIndex + 1) % numAgents
+
+        for agent in agents:
+            if hasattr(agent, 'final'):
+                agent.final(self.state)
+        self.display.finish()
+
+    def _snapshot(self):
+        """
+        Returns what _checkUnchanged compares: the Zobrist key of the state,
+        which the rules keep up to date so it takes O(1) time, and the food,
+        capsules, agent states and their configurations and scared timers.
+        """
+        data = self.state.data
+        return (data.getZobristKey(), data.food, data.capsules, data.agentStates,
+                [(agentState.configuration, agentState.scaredTimer) for agentState in data.agentStates])
+
+    def _checkUnchanged(self, agentIndex, snapshot):
+        "Raises an exception if the game state no longer matches snapshot"
+        key, food, capsules, agentStates, agents = snapshot
+        data = self.state.data
+        if data.getZobristKey() != key or data.food is not food or data.capsules is not capsules or \
+                data.agentStates is not agentStates or \
+                any([agentState.configuration is not configuration or agentState.scaredTimer != scaredTimer
+                     for agentState, (configuration, scaredTimer) in zip(agentStates, agents)]):
+            raise Exception("Agent %d changed the game state it was given; "
+                            "it cannot be run as a trusted agent" % agentIndex)
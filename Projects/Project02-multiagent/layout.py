@@ -13,17 +13,33 @@
 
 
 from util import manhattanDistance
-from game import Grid
+from game import Grid, BitGrid, toBitGrid
 import os
 import random
-from functools import reduce
+import hashlib
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 VISIBILITY_MATRIX_CACHE = {}
+# Process-wide layout registry.  PARSED_LAYOUTS maps the content hash of a
+# layout text to its parsed board, and DERIVED_DATA_CACHE maps it to a dict
+# of data computed from the board (visibility matrix, legal positions, maze
+# distances), so that every Layout with the same text shares both.
+PARSED_LAYOUTS = {}
+DERIVED_DATA_CACHE = {}
+# (modification time, lines) of the layout files read so far, by absolute
+# path; a file is read again when its modification time changes
+LAYOUT_FILE_CACHE = {}
 
 
-class Layout:
+class ParsedLayout:
     """
-    A Layout manages the static information about the game board.
+    The board described by a layout text, parsed once per process.  Layouts
+    share its walls, which must not be changed, and copy the rest.
     """
 
     def __init__(self, layoutText):
@@ -35,36 +51,132 @@ class Layout:
         self.agentPositions = []
         self.numGhosts = 0
         self.processLayoutText(layoutText)
+        self.totalFood = self.food.count()
+
+    def processLayoutText(self, layoutText):
+        """
+        Coordinates are flipped from the input format to the (x,y) convention here
+
+        The shape of the maze.  Each character
+        represents a different type of object.
+         % - Wall
+         . - Food
+         o - Capsule
+         G - Ghost
+         P - Pacman
+        Other characters are ignored.
+        """
+        maxY = self.height - 1
+        for y in range(self.height):
+            for x in range(self.width):
+                layoutChar = layoutText[maxY - y][x]
+                self.processLayoutChar(x, y, layoutChar)
+        self.agentPositions.sort()
+        self.agentPositions = [(i == 0, pos) for i, pos in self.agentPositions]
+
+    def processLayoutChar(self, x, y, layoutChar):
+        if layoutChar == '%':
+            self.walls[x][y] = True
+        elif layoutChar == '.':
+            self.food[x][y] = True
+        elif layoutChar == 'o':
+            self.capsules.append((x, y))
+        elif layoutChar == 'P':
+            self.agentPositions.append((0, (x, y)))
+        elif layoutChar in ['G']:
+            self.agentPositions.append((1, (x, y)))
+            self.numGhosts += 1
+        elif layoutChar in ['1', '2', '3', '4']:
+            self.agentPositions.append((int(layoutChar), (x, y)))
+            self.numGhosts += 1
+
+
+def layoutKey(layoutText):
+    """
+    Returns the content hash under which a layout text is registered.
+    """
+    return hashlib.sha1('\n'.join(layoutText).encode('utf-8')).hexdigest()
+
+
+def getParsedLayout(layoutText):
+    key = layoutKey(layoutText)
+    if key not in PARSED_LAYOUTS:
+        PARSED_LAYOUTS[key] = ParsedLayout(layoutText)
+        DERIVED_DATA_CACHE[key] = {}
+    return key, PARSED_LAYOUTS[key]
+
+
+class Layout:
+    """
+    A Layout manages the static information about the game board.
+
+    The walls are shared by every Layout with the same text; the food,
+    capsules and agent positions belong to each Layout.
+    """
+
+    def __init__(self, layoutText, foodGridClass=Grid):
+        """
+        foodGridClass: the class of the food grid, Grid or game.BitGrid
+        """
+        self.key, parsed = getParsedLayout(layoutText)
+        self.width = parsed.width
+        self.height = parsed.height
+        self.foodGridClass = foodGridClass
+        self.walls = parsed.walls
+        if foodGridClass == BitGrid:
+            self.food = toBitGrid(parsed.food)
+        else:
+            self.food = parsed.food.copy()
+        self.capsules = parsed.capsules[:]
+        self.agentPositions = parsed.agentPositions[:]
+        self.numGhosts = parsed.numGhosts
         self.layoutText = layoutText
-        self.totalFood = len(self.food.asList())
+        self.totalFood = parsed.totalFood
         # self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
         return self.numGhosts
 
+    def getDerivedData(self, name, compute):
+        """
+        Returns compute(self) the first time name is asked for on any Layout
+        with this text, and the same value after that.  A Layout unpickled in
+        another process (a worker of a process pool) registers its text there.
+        """
+        derived = DERIVED_DATA_CACHE.setdefault(self.key, {})
+        if name not in derived:
+            derived[name] = compute(self)
+        return derived[name]
+
     def initializeVisibilityMatrix(self):
-        global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
-            from game import Directions
-            vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH,
-                    Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH: set(), Directions.SOUTH: set(
-            ), Directions.EAST: set(), Directions.WEST: set(), Directions.STOP: set()})
-            for x in range(self.width):
-                for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)]:
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(
-                str.__add__, self.layoutText)]
+        self.visibility = self.getDerivedData('visibility', computeVisibilityMatrix)
+        VISIBILITY_MATRIX_CACHE[self.key] = self.visibility
+
+    def getLegalPositions(self):
+        """
+        Returns a new list of the (x,y) cells that are not walls.
+        """
+        return list(self.getDerivedData('legalPositions', lambda layout: tuple(layout.walls.asList(False))))
+
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the number of moves between two legal (x,y) cells, or None if
+        there is no path between them.  All the distances of the layout are
+        computed, by a breadth first search from every cell, on the first
+        call.
+        """
+        cellIds, distances = self.getMazeDistances()
+        distance = distances[cellIds[pos1]][cellIds[pos2]]
+        if distance == float('inf'):
+            return None
+        return int(distance)
+
+    def getMazeDistances(self):
+        """
+        Returns (cellIds, distances) as computed by computeMazeDistances, once
+        per layout text.
+        """
+        return self.getDerivedData('mazeDistances', computeMazeDistances)
 
     def isWall(self, pos):
         x, col = pos
@@ -97,68 +209,98 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        layout = Layout.__new__(Layout)
+        layout.__dict__.update(self.__dict__)
+        layout.food = self.food.copy()
+        layout.capsules = self.capsules[:]
+        layout.agentPositions = self.agentPositions[:]
+        return layout
 
-    def processLayoutText(self, layoutText):
-        """
-        Coordinates are flipped from the input format to the (x,y) convention here
 
-        The shape of the maze.  Each character
-        represents a different type of object.
-         % - Wall
-         . - Food
-         o - Capsule
-         G - Ghost
-         P - Pacman
-        Other characters are ignored.
-        """
-        maxY = self.height - 1
-        for y in range(self.height):
-            for x in range(self.width):
-                layoutChar = layoutText[maxY - y][x]
-                self.processLayoutChar(x, y, layoutChar)
-        self.agentPositions.sort()
-        self.agentPositions = [(i == 0, pos) for i, pos in self.agentPositions]
+def computeVisibilityMatrix(layout):
+    from game import Directions
+    vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
+    dirs = [Directions.NORTH, Directions.SOUTH,
+            Directions.WEST, Directions.EAST]
+    # Indexed vis[x][y][direction] like a Grid, which can only hold booleans
+    vis = [[dict([(direction, set()) for direction in dirs + [Directions.STOP]])
+            for y in range(layout.height)] for x in range(layout.width)]
+    for x in range(layout.width):
+        for y in range(layout.height):
+            if layout.walls[x][y] == False:
+                for vec, direction in zip(vecs, dirs):
+                    dx, dy = vec
+                    nextx, nexty = x + dx, y + dy
+                    while (nextx + nexty) != int(nextx) + int(nexty) or not layout.walls[int(nextx)][int(nexty)]:
+                        vis[x][y][direction].add((nextx, nexty))
+                        nextx, nexty = nextx + dx, nexty + dy
+    return vis
 
-    def processLayoutChar(self, x, y, layoutChar):
-        if layoutChar == '%':
-            self.walls[x][y] = True
-        elif layoutChar == '.':
-            self.food[x][y] = True
-        elif layoutChar == 'o':
-            self.capsules.append((x, y))
-        elif layoutChar == 'P':
-            self.agentPositions.append((0, (x, y)))
-        elif layoutChar in ['G']:
-            self.agentPositions.append((1, (x, y)))
-            self.numGhosts += 1
-        elif layoutChar in ['1', '2', '3', '4']:
-            self.agentPositions.append((int(layoutChar), (x, y)))
-            self.numGhosts += 1
+
+def computeMazeDistances(layout):
+    """
+    Returns (cellIds, distances): the ID of each legal cell, numbered in
+    getLegalPositions order, and the matrix of distances between cell IDs,
+    float('inf') where there is no path.  The matrix is a float NumPy array
+    when NumPy is available and a list of lists otherwise.
+
+    This is the one all-pairs distance engine of the project: evaluation
+    features (evaluationFeatures.MazeMatrix) index the same matrix.
+    """
+    cells = layout.getLegalPositions()
+    cellIds = dict([(cell, i) for i, cell in enumerate(cells)])
+    neighbors = []
+    for x, y in cells:
+        neighbors.append([cellIds[cell] for cell in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y))
+                          if cell in cellIds])
+    unreachable = float('inf')
+    distances = []
+    for source in range(len(cells)):
+        row = [unreachable] * len(cells)
+        row[source] = 0
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            for neighbor in neighbors[cell]:
+                if row[neighbor] == unreachable:
+                    row[neighbor] = row[cell] + 1
+                    queue.append(neighbor)
+        distances.append(row)
+    if np is not None:
+        distances = np.array(distances, dtype=float)
+    return cellIds, distances
+
+
+def getLayout(name, back=2, foodGridClass=Grid):
+    """
+    Loads a layout by name from a layouts directory or a .lay file, looking
+    in the current directory and up to back + 1 directories above it.
+    """
+    for level in range(back + 2):
+        directory = os.path.join(*(['.'] + ['..'] * level))
+        if name.endswith('.lay'):
+            layout = tryToLoad(os.path.join(directory, 'layouts', name), foodGridClass)
+            if layout == None:
+                layout = tryToLoad(os.path.join(directory, name), foodGridClass)
+        else:
+            layout = tryToLoad(os.path.join(directory, 'layouts', name + '.lay'), foodGridClass)
+            if layout == None:
+                layout = tryToLoad(os.path.join(directory, name + '.lay'), foodGridClass)
+        if layout != None:
+            return layout
+    return None
 
 
-def getLayout(name, back=2):
-    if name.endswith('.lay'):
-        layout = tryToLoad('layouts/' + name)
-        if layout == None:
-            layout = tryToLoad(name)
-    else:
-        layout = tryToLoad('layouts/' + name + '.lay')
-        if layout == None:
-            layout = tryToLoad(name + '.lay')
-    if layout == None and back >= 0:
-        curdir = os.path.abspath('.')
-        os.chdir('..')
-        layout = getLayout(name, back - 1)
-        os.chdir(curdir)
-    return layout
-
-
-def tryToLoad(fullname):
+def tryToLoad(fullname, foodGridClass=Grid):
+    fullname = os.path.abspath(fullname)
     if(not os.path.exists(fullname)):
         return None
-    f = open(fullname)
-    try:
-        return Layout([line.strip() for line in f])
-    finally:
-        f.close()
+    mtime = os.path.getmtime(fullname)
+    cached = LAYOUT_FILE_CACHE.get(fullname)
+    if cached is None or cached[0] != mtime:
+        f = open(fullname)
+        try:
+            cached = LAYOUT_FILE_CACHE[fullname] = (mtime, [line.strip() for line in f])
+        finally:
+            f.close()
+    return Layout(cached[1][:], foodGridClass)
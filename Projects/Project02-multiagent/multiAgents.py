@@ -14,9 +14,14 @@
 
 from util import manhattanDistance
 from game import Directions
-import random, util
+import random, util, time, collections, math
+import concurrent.futures
+import multiprocessing
+import atexit
 
 from game import Agent
+import ghostAgents
+import evaluationFeatures
 from pacman import GameState
 
 class ReflexAgent(Agent):
@@ -75,20 +80,11 @@ class ReflexAgent(Agent):
         newScaredTimes = [ghostState.scaredTimer for ghostState in newGhostStates]
 
         "*** YOUR CODE HERE ***"
-        nearestGhostDis = 1e9
-        for ghostState in newGhostStates:
-            ghostX, ghostY = ghostState.getPosition()
-            ghostX = int(ghostX)
-            ghostY = int(ghostY)
-            if ghostState.scaredTimer == 0:
-                nearestGhostDis = min(nearestGhostDis, manhattanDistance((ghostX, ghostY), newPos))
-                
-        nearestFootDis = 1e9
-        for food in newFood.asList():
-            nearestFootDis = min(nearestFootDis, manhattanDistance(food, newPos))
-        if not newFood.asList():
-            nearestFootDis = 0
-        
+        # Ghosts that are not scared are always on a grid point
+        features = evaluationFeatures.getFeatures(successorGameState)
+        nearestGhostDis = features.nearestGhost(default = 1e9)
+        nearestFootDis = features.nearestFood(default = 0)
+
         return successorGameState.getScore() - 7 / (nearestGhostDis + 1) - nearestFootDis / 3
 
 def scoreEvaluationFunction(currentGameState: GameState):
@@ -116,10 +112,115 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    # Trees with fewer plies than this are searched serially even with workers
+    MIN_PARALLEL_PLIES = 5
+    # Anytime agents think for at most TIME_FRACTION of the game's move
+    # timeout, and at most timeLimit seconds, DEFAULT_TIME_LIMIT if not given
+    TIME_FRACTION = 0.5
+    DEFAULT_TIME_LIMIT = 1.0
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', workers = '0'):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        self.workers = int(workers)
+        self.timeLimit = None
+        self.moveTimeout = None
+
+    def setMoveTimeout(self, timeout):
+        """
+        Called by the game with ClassicGameRules.getMoveTimeout before it starts.
+        """
+        self.moveTimeout = timeout
+
+    def getTimeBudget(self):
+        """
+        Returns the seconds an anytime agent may spend on a move:
+        self.timeLimit, or DEFAULT_TIME_LIMIT when that is not given, capped
+        by a share of the move timeout.
+        """
+        budget = self.timeLimit or self.DEFAULT_TIME_LIMIT
+        if self.moveTimeout:
+            budget = min(budget, self.moveTimeout * self.TIME_FRACTION)
+        return budget
+
+    def rootActionValue(self, gameState, action, alpha):
+        """
+        Returns the value of taking action in gameState, the root of the
+        search.  alpha is the best value already known for another root action;
+        when the value is lower than alpha, a bound may be returned instead.
+        Subclasses define this to support the parallel search below.
+        """
+        util.raiseNotDefined()
+
+    def getParallelAction(self, gameState):
+        """
+        Searches each legal pacman action of gameState in its own worker
+        process and returns the first action with the best value, which is
+        the action the serial search picks.  The best value found so far is
+        shared with workers as they start, as alpha.
+
+        Returns None when the agent should search serially instead: with
+        fewer than two workers, fewer than two legal actions or a tree
+        shallower than MIN_PARALLEL_PLIES.
+
+        python pacman.py -p MinimaxAgent -a depth=3,workers=4 -l mediumClassic
+        """
+        actions = gameState.getLegalActions(0)
+        if self.workers < 2 or len(actions) < 2 or \
+                self.depth * gameState.getNumAgents() < self.MIN_PARALLEL_PLIES:
+            return None
+        executor, shared_alpha = getRootSearchPool(self.workers)
+        shared_alpha.value = -1e9
+        futures = [executor.submit(searchRootAction, self, gameState, action) for action in actions]
+        max_score, max_action = -1e9, Directions.STOP
+        for action, future in zip(actions, futures):
+            new_score = future.result()
+            if new_score > max_score:
+                max_score, max_action = new_score, action
+        return max_action
+
+# Worker pools for parallel root search, by number of workers and
+# GameState.copyOnWrite setting.  They live outside the agents so that agents
+# can be pickled and sent to the workers, and are shut down at exit.
+_rootSearchPools = {}
+_sharedAlpha = None
+
+def getRootSearchPool(workers):
+    """
+    Returns a ProcessPoolExecutor with workers processes that use this
+    process's GameState.copyOnWrite setting, and the shared best root value
+    its workers read and raise.
+    """
+    key = (workers, GameState.copyOnWrite)
+    if key not in _rootSearchPools:
+        if not _rootSearchPools:
+            atexit.register(shutdownRootSearchPools)
+        shared_alpha = multiprocessing.Value('d', -1e9)
+        executor = concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=initRootSearchWorker, initargs=(shared_alpha, GameState.copyOnWrite))
+        _rootSearchPools[key] = (executor, shared_alpha)
+    return _rootSearchPools[key]
+
+def shutdownRootSearchPools():
+    for executor, shared_alpha in _rootSearchPools.values():
+        executor.shutdown()
+    _rootSearchPools.clear()
+
+def initRootSearchWorker(shared_alpha, copyOnWrite):
+    global _sharedAlpha
+    _sharedAlpha = shared_alpha
+    GameState.copyOnWrite = copyOnWrite
+
+def searchRootAction(agent, gameState, action):
+    """
+    Runs in a worker process: returns the value of one root action.
+    """
+    value = agent.rootActionValue(gameState, action, _sharedAlpha.value)
+    with _sharedAlpha.get_lock():
+        if value > _sharedAlpha.value:
+            _sharedAlpha.value = value
+    return value
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
@@ -151,7 +252,15 @@ class MinimaxAgent(MultiAgentSearchAgent):
         """
         "*** YOUR CODE HERE ***"
         # util.raiseNotDefined()
+        if self.workers > 1:
+            action = self.getParallelAction(gameState)
+            if action is not None:
+                return action
         return self.minimaxSearch(gameState, agentIndex=0, depth=self.depth)[1]
+
+    def rootActionValue(self, gameState, action, alpha):
+        next_agent, next_depth = (1, self.depth) if gameState.getNumAgents() > 1 else (0, self.depth - 1)
+        return self.minimaxSearch(gameState.generateSuccessor(0, action), next_agent, next_depth)[0]
     
     
     def minimaxSearch(self, gameState, agentIndex, depth):
@@ -206,7 +315,15 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         """
         "*** YOUR CODE HERE ***"
         # util.raiseNotDefined()
+        if self.workers > 1:
+            action = self.getParallelAction(gameState)
+            if action is not None:
+                return action
         return self.alphabetaSearch(gameState, 0, self.depth, -1e9, 1e9)[1]
+
+    def rootActionValue(self, gameState, action, alpha):
+        next_agent, next_depth = (1, self.depth) if gameState.getNumAgents() > 1 else (0, self.depth - 1)
+        return self.alphabetaSearch(gameState.generateSuccessor(0, action), next_agent, next_depth, alpha, 1e9)[0]
     
     def alphabetaSearch(self, gameState, agentIndex, depth, alpha, beta):
         if depth == 0 or gameState.isWin() or gameState.isLose():
@@ -252,6 +369,164 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
             beta = min(beta, min_score)
         return min_score, min_action
     
+class SearchTimeout(Exception):
+    """
+    Raised inside a search when the time budget for the move runs out.
+    """
+    pass
+
+# Kinds of transposition table entries: the stored value is the exact value
+# of the state, or only a lower or upper bound on it
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class IterativeDeepeningAlphaBetaAgent(AlphaBetaAgent):
+    """
+    An anytime alpha-beta agent.  It searches to depth 1, 2, ... self.depth
+    until the time budget for the move runs out, and plays the best action
+    of the deepest search that finished.
+
+    States reached by different move orders are looked up in a bounded
+    transposition table keyed by GameState.getZobristKey().  Moves are tried
+    in the order: the table's best move (the principal variation of the last
+    iteration), the killer moves of the ply, then the rest.
+
+    The time budget is timeLimit seconds, DEFAULT_TIME_LIMIT when that is
+    not given, capped by TIME_FRACTION of the game's move timeout (see
+    getTimeBudget).  With verbose=True the depth and speed of each search
+    are printed.
+
+    python pacman.py -p IterativeDeepeningAlphaBetaAgent -a timeLimit=0.5 -l mediumClassic
+    """
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '12', timeLimit = None,
+                 tableSize = '200000', verbose = 'False'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth)
+        self.timeLimit = float(timeLimit) if timeLimit is not None else None
+        self.tableSize = int(tableSize)
+        self.verbose = str(verbose) in ['True', '1']
+        self.table = {}
+        self.searchStats = [] # (depth reached, nodes searched, seconds) for each move
+
+    def getAction(self, gameState: GameState):
+        """
+        Returns the action of the deepest alpha-beta search that fits in the
+        time budget.
+        """
+        start = time.perf_counter()
+        budget = self.getTimeBudget()
+        self.nodes = 0
+        self.killers = {}
+        best_action, depth_reached = Directions.STOP, 0
+        for depth in range(1, self.depth + 1):
+            # Always finish depth 1 so that there is an action to return
+            self.deadline = start + budget if depth > 1 else float('inf')
+            self.iterationDepth = depth
+            try:
+                best_action = self.alphabetaSearch(gameState, 0, depth, -1e9, 1e9)[1]
+            except SearchTimeout:
+                break
+            depth_reached = depth
+        seconds = time.perf_counter() - start
+        self.searchStats.append((depth_reached, self.nodes, seconds))
+        if self.verbose:
+            print('Depth %d: %d nodes in %.2f seconds (%.0f nodes/s)' % (
+                depth_reached, self.nodes, seconds, self.nodes / max(seconds, 1e-9)))
+        return best_action
+
+    def alphabetaSearch(self, gameState, agentIndex, depth, alpha, beta):
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if depth == 0 or gameState.isWin() or gameState.isLose():
+            return self.evaluationFunction(gameState), Directions.STOP
+
+        key = (gameState.getZobristKey(), agentIndex)
+        entry = self.table.get(key)
+        table_action = None
+        if entry is not None:
+            entry_depth, value, kind, table_action = entry
+            if entry_depth >= depth:
+                if kind == EXACT or (kind == LOWER and value >= beta) or (kind == UPPER and value <= alpha):
+                    return value, table_action
+
+        if agentIndex == 0:
+            value, action = self.alphaSearch(gameState, agentIndex, depth, alpha, beta, table_action)
+        else:
+            value, action = self.betaSearch(gameState, agentIndex, depth, alpha, beta, table_action)
+
+        if value <= alpha:
+            kind = UPPER
+        elif value >= beta:
+            kind = LOWER
+        else:
+            kind = EXACT
+        self.storeEntry(key, (depth, value, kind, action))
+        return value, action
+
+    def alphaSearch(self, gameState, agentIndex, depth, alpha, beta, first_action = None):
+        next_agent, next_depth, ply = self.nextTurn(gameState, agentIndex, depth)
+        max_score, max_action = -1e9, Directions.STOP
+        for action in self.orderedActions(gameState, agentIndex, ply, first_action):
+            successor_game_state = gameState.generateSuccessor(agentIndex, action)
+            new_score = self.alphabetaSearch(successor_game_state, next_agent, next_depth, alpha, beta)[0]
+            if new_score > max_score:
+                max_score, max_action = new_score, action
+            if max_score >= beta:
+                self.addKiller(ply, action)
+                break
+            alpha = max(alpha, max_score)
+        return max_score, max_action
+
+    def betaSearch(self, gameState, agentIndex, depth, alpha, beta, first_action = None):
+        next_agent, next_depth, ply = self.nextTurn(gameState, agentIndex, depth)
+        min_score, min_action = 1e9, Directions.STOP
+        for action in self.orderedActions(gameState, agentIndex, ply, first_action):
+            successor_game_state = gameState.generateSuccessor(agentIndex, action)
+            new_score = self.alphabetaSearch(successor_game_state, next_agent, next_depth, alpha, beta)[0]
+            if new_score < min_score:
+                min_score, min_action = new_score, action
+            if min_score <= alpha:
+                self.addKiller(ply, action)
+                break
+            beta = min(beta, min_score)
+        return min_score, min_action
+
+    def nextTurn(self, gameState, agentIndex, depth):
+        """
+        Returns the agent and depth of the next turn, and the number of turns
+        from the root to this one.
+        """
+        num_agents = gameState.getNumAgents()
+        ply = (self.iterationDepth - depth) * num_agents + agentIndex
+        if agentIndex == num_agents - 1:
+            return 0, depth - 1, ply
+        return agentIndex + 1, depth, ply
+
+    def orderedActions(self, gameState, agentIndex, ply, first_action):
+        actions = gameState.getLegalActions(agentIndex)
+        front = [action for action in [first_action] + self.killers.get(ply, []) if action in actions]
+        if not front:
+            return actions
+        ordered = []
+        for action in front + actions:
+            if action not in ordered:
+                ordered.append(action)
+        return ordered
+
+    def addKiller(self, ply, action):
+        # Keep the two most recent moves that caused a cutoff at this ply
+        killers = self.killers.setdefault(ply, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+
+    def storeEntry(self, key, entry):
+        # Evict the oldest entry once the table is full
+        table = self.table
+        if key not in table and len(table) >= self.tableSize:
+            del table[next(iter(table))]
+        table[key] = entry
+
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
       Your expectimax agent (question 4)
@@ -266,7 +541,15 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         """
         "*** YOUR CODE HERE ***"
         # util.raiseNotDefined()
+        if self.workers > 1:
+            action = self.getParallelAction(gameState)
+            if action is not None:
+                return action
         return self.expectimaxsearch(gameState, 0, self.depth)[1]
+
+    def rootActionValue(self, gameState, action, alpha):
+        next_agent, next_depth = (1, self.depth) if gameState.getNumAgents() > 1 else (0, self.depth - 1)
+        return self.expectimaxsearch(gameState.generateSuccessor(0, action), next_agent, next_depth)[0]
     
     def expectimaxsearch(self, game_state, agent_index, depth):
         if depth == 0 or game_state.isWin() or game_state.isLose():
@@ -304,6 +587,247 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         exp_score /= len(actions)
         return exp_score, exp_action # exp_action is never used!
 
+class MemoizedExpectimaxAgent(ExpectimaxAgent):
+    """
+    An ExpectimaxAgent that caches values by (GameState.getZobristKey(),
+    agentIndex, depth).  A state reached by several move sequences is then
+    searched only once: for example, the same ghost configuration reached
+    after different pacman moves.  Evaluations are cached by state key as
+    well.
+
+    With cacheSize=0 both caches are emptied before every move.  Otherwise
+    they are kept from move to move, holding at most cacheSize entries each
+    and dropping the least recently used one first.
+
+    python pacman.py -p MemoizedExpectimaxAgent -a depth=3,cacheSize=100000 -l smallClassic
+    """
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', cacheSize = '0', verbose = 'False'):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth)
+        self.cacheSize = int(cacheSize)
+        self.verbose = str(verbose) in ['True', '1']
+        self.valueCache = collections.OrderedDict()
+        self.evalCache = collections.OrderedDict()
+        # Lookups and hits for the whole game, and for the last move
+        self.valueLookups = self.valueHits = self.evalLookups = self.evalHits = 0
+        self.moveStats = None
+
+    def getAction(self, gameState: GameState):
+        if not self.cacheSize:
+            self.valueCache.clear()
+            self.evalCache.clear()
+        before = (self.valueLookups, self.valueHits, self.evalLookups, self.evalHits)
+        action = self.expectimaxsearch(gameState, 0, self.depth)[1]
+        after = (self.valueLookups, self.valueHits, self.evalLookups, self.evalHits)
+        self.moveStats = tuple([a - b for a, b in zip(after, before)])
+        if self.verbose:
+            value_lookups, value_hits, eval_lookups, eval_hits = self.moveStats
+            print('Value cache: %d/%d hits (%.1f%%), evaluation cache: %d/%d hits (%.1f%%)' % (
+                value_hits, value_lookups, 100.0 * value_hits / max(value_lookups, 1),
+                eval_hits, eval_lookups, 100.0 * eval_hits / max(eval_lookups, 1)))
+        return action
+
+    def getHitRates(self):
+        """
+        Returns the value and evaluation cache hit rates over the whole game.
+        """
+        return (float(self.valueHits) / max(self.valueLookups, 1),
+                float(self.evalHits) / max(self.evalLookups, 1))
+
+    def expectimaxsearch(self, game_state, agent_index, depth):
+        if depth == 0 or game_state.isWin() or game_state.isLose():
+            return self.evaluate(game_state), Directions.STOP
+        key = (game_state.getZobristKey(), agent_index, depth)
+        self.valueLookups += 1
+        ret = self.cacheGet(self.valueCache, key)
+        if ret is not None:
+            self.valueHits += 1
+            return ret
+        ret = ExpectimaxAgent.expectimaxsearch(self, game_state, agent_index, depth)
+        self.cachePut(self.valueCache, key, ret)
+        return ret
+
+    def evaluate(self, game_state):
+        key = game_state.getZobristKey()
+        self.evalLookups += 1
+        value = self.cacheGet(self.evalCache, key)
+        if value is not None:
+            self.evalHits += 1
+            return value
+        value = self.evaluationFunction(game_state)
+        self.cachePut(self.evalCache, key, value)
+        return value
+
+    def cacheGet(self, cache, key):
+        value = cache.get(key)
+        if value is not None and self.cacheSize:
+            cache.move_to_end(key)
+        return value
+
+    def cachePut(self, cache, key, value):
+        cache[key] = value
+        if self.cacheSize and len(cache) > self.cacheSize:
+            cache.popitem(last=False)
+
+class MCTSNode:
+    """
+    A state in which it is pacman's turn, in the tree of an MCTSAgent.
+
+    For each legal pacman action the node keeps the number of times it was
+    tried and the sum of the playout values that followed.  Ghost moves make
+    an action lead to different states, so children are kept per action, by
+    the Zobrist key of the next state in which it is pacman's turn.
+    """
+
+    def __init__(self, state):
+        self.state = state
+        self.actions = state.getLegalActions(0)
+        self.visits = 0
+        self.actionVisits = dict([(action, 0) for action in self.actions])
+        self.actionValues = dict([(action, 0.0) for action in self.actions])
+        self.children = dict([(action, {}) for action in self.actions])
+
+    def isTerminal(self):
+        return self.state.isWin() or self.state.isLose()
+
+class MCTSAgent(MultiAgentSearchAgent):
+    """
+    An anytime Monte Carlo tree search agent using UCT.
+
+    Each iteration walks down the tree choosing pacman actions by UCB1 and
+    sampling the ghosts' replies from a ghost model (RandomGhost or
+    DirectionalGhost in ghostAgents.py), adds the first new state it reaches
+    and scores it by a playout: random pacman moves against the ghost model
+    for at most rolloutDepth pacman moves, valued by the evaluation
+    function.  Values are normalized to [0, 1] by the range seen so far.
+
+    The agent runs a fixed number of iterations, or when iterations=0 until
+    its time budget (see MultiAgentSearchAgent.getTimeBudget: timeLimit, or
+    DEFAULT_TIME_LIMIT seconds) is used up.  With verbose=True the playouts
+    of each move are printed.
+    It plays the most visited action, and keeps the subtree of the state
+    the game actually reaches for the next move.
+
+    python pacman.py -p MCTSAgent -a timeLimit=0.5,ghost=DirectionalGhost -l smallClassic
+    """
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', iterations = '0', timeLimit = None,
+                 rolloutDepth = '20', ghost = 'RandomGhost', exploration = '1.4', verbose = 'False'):
+        MultiAgentSearchAgent.__init__(self, evalFn)
+        self.iterations = int(iterations)
+        self.timeLimit = float(timeLimit) if timeLimit is not None else None
+        self.rolloutDepth = int(rolloutDepth)
+        self.ghostClass = getattr(ghostAgents, ghost)
+        self.exploration = float(exploration)
+        self.verbose = str(verbose) in ['True', '1']
+        self.ghostModels = {}
+        self.root = None
+        self.lastAction = None
+        self.moveStats = [] # (playouts, seconds, reused visits) for each move
+
+    def getAction(self, gameState: GameState):
+        start = time.perf_counter()
+        root = self.reuseTree(gameState)
+        reused = root.visits
+        self.minValue, self.maxValue = float('inf'), float('-inf')
+        deadline = start + self.getTimeBudget()
+        playouts = 0
+        while (playouts < self.iterations) if self.iterations else (time.perf_counter() < deadline):
+            self.runIteration(root)
+            playouts += 1
+        action = max(root.actions, key=lambda action: (root.actionVisits[action],
+                                                       root.actionValues[action] / max(root.actionVisits[action], 1)))
+        self.root, self.lastAction = root, action
+        seconds = time.perf_counter() - start
+        self.moveStats.append((playouts, seconds, reused))
+        if self.verbose:
+            print('MCTS: %d playouts in %.2f seconds (%.0f playouts/s), %d visits reused' % (
+                playouts, seconds, playouts / max(seconds, 1e-9), reused))
+        return action
+
+    def reuseTree(self, gameState):
+        """
+        Returns the node of gameState in the tree of the last move, or a new
+        root when the game left that tree.
+        """
+        if self.root is not None and self.lastAction in self.root.children:
+            node = self.root.children[self.lastAction].get(gameState.getZobristKey())
+            if node is not None and node.state == gameState:
+                return node
+        return MCTSNode(gameState)
+
+    def runIteration(self, root):
+        node, path = root, []
+        while True:
+            if node.isTerminal():
+                value = self.evaluationFunction(node.state)
+                break
+            action = self.selectAction(node)
+            next_state = self.playTurn(node.state, action)
+            path.append((node, action))
+            children = node.children[action]
+            key = next_state.getZobristKey()
+            if key not in children:
+                children[key] = MCTSNode(next_state)
+                value = self.rollout(next_state)
+                break
+            node = children[key]
+        self.minValue = min(self.minValue, value)
+        self.maxValue = max(self.maxValue, value)
+        for node, action in path:
+            node.visits += 1
+            node.actionVisits[action] += 1
+            node.actionValues[action] += value
+
+    def selectAction(self, node):
+        """
+        Returns an untried action if there is one, and the action with the
+        highest UCB1 score otherwise.
+        """
+        for action in node.actions:
+            if node.actionVisits[action] == 0:
+                return action
+        value_range = self.maxValue - self.minValue
+        log_visits = math.log(node.visits)
+        best_score, best_action = float('-inf'), node.actions[0]
+        for action in node.actions:
+            visits = node.actionVisits[action]
+            if value_range > 0:
+                mean = (node.actionValues[action] / visits - self.minValue) / value_range
+            else:
+                mean = 0.5
+            score = mean + self.exploration * math.sqrt(log_visits / visits)
+            if score > best_score:
+                best_score, best_action = score, action
+        return best_action
+
+    def playTurn(self, state, action):
+        """
+        Returns the state after pacman takes action and every ghost replies
+        with a move sampled from the ghost model.
+        """
+        state = state.generateSuccessor(0, action)
+        for ghost_index in range(1, state.getNumAgents()):
+            if state.isWin() or state.isLose():
+                break
+            state = state.generateSuccessor(ghost_index, self.getGhostModel(ghost_index).getAction(state))
+        return state
+
+    def rollout(self, state):
+        for move in range(self.rolloutDepth):
+            if state.isWin() or state.isLose():
+                break
+            actions = state.getLegalActions(0)
+            if len(actions) > 1 and Directions.STOP in actions:
+                actions.remove(Directions.STOP)
+            state = self.playTurn(state, random.choice(actions))
+        return self.evaluationFunction(state)
+
+    def getGhostModel(self, ghost_index):
+        if ghost_index not in self.ghostModels:
+            self.ghostModels[ghost_index] = self.ghostClass(ghost_index)
+        return self.ghostModels[ghost_index]
+
 def betterEvaluationFunction(currentGameState: GameState):
     """
     Your extreme ghost-hunting, pellet-nabbing, food-gobbling, unstoppable
@@ -313,28 +837,14 @@ def betterEvaluationFunction(currentGameState: GameState):
     """
     "*** YOUR CODE HERE ***"
     # util.raiseNotDefined()
-    pacman_pos = currentGameState.getPacmanPosition()
-    food = currentGameState.getFood()
-    foods = food.asList()
-    ghost_states = currentGameState.getGhostStates()
-    scared_times = [ghost_state.scaredTimer for ghost_state in ghost_states]
-
-    nearest_ghost_dis = 1e9
-    for ghost_state in ghost_states:
-        ghost_x, ghost_y = ghost_state.getPosition()
-        ghost_x = int(ghost_x)
-        ghost_y = int(ghost_y)
-        if ghost_state.scaredTimer == 0:
-            nearest_ghost_dis = min(nearest_ghost_dis,\
-                                    manhattanDistance((ghost_x, ghost_y),\
-                                    pacman_pos))
-        else:
-            nearest_ghost_dis = -10
-    nearest_food_dis = 1e9
-    for food in foods:
-        nearest_food_dis = min(nearest_food_dis,manhattanDistance(food, pacman_pos))
-    if not foods:
-        nearest_food_dis = 0
+    # The features of a state are cached, so sibling leaves share the food
+    # distances.  Ghosts that are not scared are always on a grid point.
+    features = evaluationFeatures.getFeatures(currentGameState)
+    if features.nearestGhost(scared = True) is not None:
+        nearest_ghost_dis = -10
+    else:
+        nearest_ghost_dis = features.nearestGhost(default = 1e9)
+    nearest_food_dis = features.nearestFood(default = 0)
     return currentGameState.getScore()-7/(nearest_ghost_dis+1)\
            -nearest_food_dis/3
 
@@ -28,7 +28,7 @@ from pprint import PrettyPrinter
 pp = PrettyPrinter()
 
 from game import Agent
-from pacman import GameState
+from pacman import GameState, ExploredStateCounter
 from ghostAgents import RandomGhost, DirectionalGhost
 import random
 import math
@@ -183,6 +183,8 @@ class GradingAgent(Agent):
         if 'registerInitialState' in dir(self.studentAgent):
             self.studentAgent.registerInitialState(state)
         random.seed(self.seed)
+        # the number of states explored per move is graded
+        GameState.setExploredCounter(ExploredStateCounter())
 
     def getAction(self, state):
         GameState.getAndResetExplored()
@@ -292,6 +294,7 @@ class PolyAgent(Agent):
             if 'registerInitialState' in dir(agent):
                 agent.registerInitialState(state)
         random.seed(self.seed)
+        GameState.setExploredCounter(ExploredStateCounter())
 
     def getAction(self, state):
         # survey agents
@@ -43,6 +43,9 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Grid
+from game import BitGrid
+from game import zobristKey
 from util import nearestPoint
 from util import manhattanDistance
 import util
@@ -77,16 +80,35 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable counting the distinct states seen by generateSuccessor;
+    # None (the default) turns the counting off (see setExploredCounter)
+    explored = None
+
+    # When True, successors share the food, capsules and unmoved AgentStates
+    # of their parent instead of copying them (see GameStateData)
+    copyOnWrite = False
 
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
+        """
+        Returns the explored state counter and replaces it with a new, empty
+        one of the same class.  An empty ExploredStateCounter is returned when
+        counting is off.
+        """
+        tmp = GameState.explored
+        if tmp is None:
+            return ExploredStateCounter()
+        GameState.explored = tmp.__class__()
         return tmp
-    
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def setExploredCounter(counter):
+        """
+        Starts counting explored states with counter, any object with an
+        add(state) method, or stops counting if counter is None.
+        """
+        GameState.explored = counter
+    setExploredCounter = staticmethod(setExploredCounter)
+
     def getLegalActions(self, agentIndex=0):
         """
         Returns the legal actions for the agent specified.
@@ -109,7 +131,10 @@ class GameState:
             raise Exception('Can\'t generate a successor of a terminal state.')
 
         # Copy current state
-        state = GameState(self)
+        state = GameState(self, GameState.copyOnWrite)
+        if GameState.copyOnWrite:
+            agentStates = state.data.agentStates
+            agentStates[agentIndex] = agentStates[agentIndex].copy()
 
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
@@ -122,7 +147,9 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
         else:
+            state.data.zobrist ^= state.data.getAgentZobristKey(agentIndex)
             GhostRules.decrementTimer(state.data.agentStates[agentIndex])
+            state.data.zobrist ^= state.data.getAgentZobristKey(agentIndex)
 
         # Resolve multi-agent effects
         GhostRules.checkDeath(state, agentIndex)
@@ -130,8 +157,9 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        if GameState.explored is not None:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
         return state
 
     def getLegalPacmanActions(self):
@@ -222,17 +250,26 @@ class GameState:
     def isWin(self):
         return self.data._win
 
+    def getZobristKey(self):
+        """
+        Returns a 64 bit key of the state, for transposition tables.  Equal
+        states have equal keys, and different states different keys up to
+        64 bit collisions.  It is kept up to date as successors are
+        generated, so this is cheaper than hashing the state.
+        """
+        return self.data.getZobristKey()
+
     #############################################
     #             Helper methods:               #
     # You shouldn't need to call these directly #
     #############################################
 
-    def __init__(self, prevState=None):
+    def __init__(self, prevState=None, copyOnWrite=False):
         """
         Generates a new state by copying information from its predecessor.
         """
         if prevState != None:  # Initial state
-            self.data = GameStateData(prevState.data)
+            self.data = GameStateData(prevState.data, copyOnWrite)
         else:
             self.data = GameStateData()
 
@@ -257,11 +294,31 @@ class GameState:
 
         return str(self.data)
 
-    def initialize(self, layout, numGhostAgents=1000):
+    def initialize(self, layout, numGhostAgents=1000, foodGridClass=None):
         """
         Creates an initial game state from a layout array (see layout.py).
         """
-        self.data.initialize(layout, numGhostAgents)
+        self.data.initialize(layout, numGhostAgents, foodGridClass)
+
+
+class ExploredStateCounter:
+    """
+    Counts distinct GameStates by their 64 bit GameStateData.fingerprint, so
+    that the states themselves need not be kept alive.  len() gives the
+    number of distinct states added.
+    """
+
+    def __init__(self):
+        self.fingerprints = set()
+
+    def add(self, state):
+        self.fingerprints.add(state.data.fingerprint())
+
+    def __contains__(self, state):
+        return state.data.fingerprint() in self.fingerprints
+
+    def __len__(self):
+        return len(self.fingerprints)
 
 ############################################################################
 #                     THE HIDDEN SECRETS OF PACMAN                         #
@@ -284,11 +341,11 @@ class ClassicGameRules:
     def __init__(self, timeout=30):
         self.timeout = timeout
 
-    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False):
+    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False, trusted=False):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize(layout, len(ghostAgents))
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        game = Game(agents, display, self, catchExceptions=catchExceptions, trusted=trusted)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -349,7 +406,7 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions(state.getPacmanState().configuration, state.data.layout.walls)
+        return Actions.getLegalActions(state.getPacmanState().configuration, state.data.layout.walls)
     getLegalActions = staticmethod(getLegalActions)
 
     def applyAction(state, action):
@@ -364,8 +421,10 @@ class PacmanRules:
 
         # Update Configuration
         vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
+        state.data.zobrist ^= state.data.getAgentZobristKey(0)
         pacmanState.configuration = pacmanState.configuration.generateSuccessor(
             vector)
+        state.data.zobrist ^= state.data.getAgentZobristKey(0)
 
         # Eat
         next = pacmanState.configuration.getPosition()
@@ -382,6 +441,7 @@ class PacmanRules:
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data.zobrist ^= zobristKey('food', x, y)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -390,11 +450,19 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if(position in state.getCapsules()):
+            # The capsule list and ghost states may be shared with the
+            # previous state, so change copies of them
+            state.data.capsules = state.data.capsules[:]
             state.data.capsules.remove(position)
+            state.data.zobrist ^= zobristKey('capsule', x, y)
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agentStates)):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.zobrist ^= state.data.getAgentZobristKey(index)
+                ghostState = state.data.agentStates[index].copy()
+                ghostState.scaredTimer = SCARED_TIME
+                state.data.agentStates[index] = ghostState
+                state.data.zobrist ^= state.data.getAgentZobristKey(index)
     consume = staticmethod(consume)
 
 
@@ -410,14 +478,7 @@ class GhostRules:
         reach a dead end, but can turn 90 degrees at intersections.
         """
         conf = state.getGhostState(ghostIndex).configuration
-        possibleActions = Actions.getPossibleActions(
-            conf, state.data.layout.walls)
-        reverse = Actions.reverseDirection(conf.direction)
-        if Directions.STOP in possibleActions:
-            possibleActions.remove(Directions.STOP)
-        if reverse in possibleActions and len(possibleActions) > 1:
-            possibleActions.remove(reverse)
-        return possibleActions
+        return Actions.getLegalGhostActions(conf, state.data.layout.walls)
     getLegalActions = staticmethod(getLegalActions)
 
     def applyAction(state, action, ghostIndex):
@@ -431,8 +492,10 @@ class GhostRules:
         if ghostState.scaredTimer > 0:
             speed /= 2.0
         vector = Actions.directionToVector(action, speed)
+        state.data.zobrist ^= state.data.getAgentZobristKey(ghostIndex)
         ghostState.configuration = ghostState.configuration.generateSuccessor(
             vector)
+        state.data.zobrist ^= state.data.getAgentZobristKey(ghostIndex)
     applyAction = staticmethod(applyAction)
 
     def decrementTimer(ghostState):
@@ -461,9 +524,14 @@ class GhostRules:
     def collide(state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             state.data.scoreChange += 200
+            state.data.zobrist ^= state.data.getAgentZobristKey(agentIndex)
+            ghostState = ghostState.copy()
+            state.data.agentStates[agentIndex] = ghostState
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
+            state.data.zobrist ^= state.data.getAgentZobristKey(agentIndex)
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -555,18 +623,34 @@ def readCommand(argv):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--bitGrid', action='store_true', dest='bitGrid',
+                      help='Store food in a bitboard (game.BitGrid) instead of a list of lists', default=False)
+    parser.add_option('--copyOnWrite', action='store_true', dest='copyOnWrite',
+                      help='Share unchanged data between a game state and its successors', default=False)
+    parser.add_option('--parallel', dest='parallel', type='int',
+                      help=default('Play the games after the training games on this many worker processes, '
+                                   'without graphics (0 plays them here)'), metavar='WORKERS', default=0)
+    parser.add_option('--trusted', action='store_true', dest='trusted',
+                      help='Hand agents the game state itself instead of copies, without timeouts or muting '
+                      '(for agents that do not change the states they are given, best with -q; '
+                      'not with -c)', default=False)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
         raise Exception('Command line input not understood: ' + str(otherjunk))
+    if options.trusted and options.catchExceptions:
+        raise Exception('--trusted turns off the timeouts and exception handling that -c asks for')
     args = dict()
 
     # Fix the random seed
     if options.fixRandomSeed:
         random.seed('cs188')
 
+    GameState.copyOnWrite = options.copyOnWrite
+
     # Choose a layout
-    args['layout'] = layout.getLayout(options.layout)
+    foodGridClass = BitGrid if options.bitGrid else Grid
+    args['layout'] = layout.getLayout(options.layout, foodGridClass=foodGridClass)
     if args['layout'] == None:
         raise Exception("The layout " + options.layout + " cannot be found")
 
@@ -607,6 +691,8 @@ def readCommand(argv):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['parallel'] = options.parallel
+    args['trusted'] = options.trusted
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
@@ -673,14 +759,115 @@ def replayGame(layout, actions, display):
     display.finish()
 
 
-def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30):
+class GameResult:
+    """
+    The outcome of a game played in a worker process by runGames with
+    parallel workers, in place of the Game itself.
+    """
+
+    def __init__(self, index, seed, score, win, numMoves, agentTime, moveHistory):
+        self.index = index
+        self.seed = seed
+        self.score = score
+        self.win = win
+        self.numMoves = numMoves  # Pacman moves
+        self.agentTime = agentTime  # Seconds spent in the pacman agent
+        self.moveHistory = moveHistory
+
+
+_gameWorker = {}
+
+
+def initGameWorker(layout, agentsPickle, catchExceptions, timeout, copyOnWrite, trusted):
+    """
+    Runs once in each worker process of runGamesInParallel.
+    """
+    GameState.copyOnWrite = copyOnWrite
+    _gameWorker['layout'] = layout
+    _gameWorker['agentsPickle'] = agentsPickle
+    _gameWorker['catchExceptions'] = catchExceptions
+    _gameWorker['timeout'] = timeout
+    _gameWorker['trusted'] = trusted
+
+
+def playGameInWorker(index, seed):
+    """
+    Plays game index with fresh copies of the agents and the random module
+    seeded with seed, so that the result does not depend on which worker
+    plays the game or what it played before.  Returns plain values, which
+    the parent turns into a GameResult.
+    """
+    import pickle
+    import textDisplay
+    random.seed(seed)
+    pacman, ghosts = pickle.loads(_gameWorker['agentsPickle'])
+    rules = ClassicGameRules(_gameWorker['timeout'])
+    game = rules.newGame(_gameWorker['layout'], pacman, ghosts, textDisplay.NullGraphics(),
+                         True, _gameWorker['catchExceptions'], _gameWorker['trusted'])
+    game.run()
+    numMoves = len([move for move in game.moveHistory if move[0] == 0])
+    return (game.state.getScore(), game.state.isWin(), numMoves, game.totalAgentTimes[0],
+            game.moveHistory)
+
+
+def runGamesInParallel(layout, pacman, ghosts, indices, workers, catchExceptions=False, timeout=30,
+                       trusted=False):
+    """
+    Plays the games with the given indices on a pool of worker processes and
+    returns their GameResults in index order.  Each game gets its own seed
+    from the random module, so a fixed random seed (-f) replays the same
+    games however they are scheduled.  A line is printed for each game as
+    it finishes.
+    """
+    import concurrent.futures
+    import pickle
+    agentsPickle = pickle.dumps((pacman, ghosts))
+    seeds = dict([(i, random.randrange(2 ** 31)) for i in indices])
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=initGameWorker,
+                                                initargs=(layout, agentsPickle, catchExceptions, timeout,
+                                                          GameState.copyOnWrite, trusted)) as executor:
+        futures = dict([(executor.submit(playGameInWorker, i, seeds[i]), i) for i in indices])
+        for future in concurrent.futures.as_completed(futures):
+            i = futures[future]
+            result = GameResult(i, seeds[i], *future.result())
+            print('Game %d: %s, score %d, %d moves, %.2f seconds in the agent' % (
+                i + 1, ['Loss', 'Win'][int(result.win)], result.score, result.numMoves, result.agentTime))
+            sys.stdout.flush()
+            results.append(result)
+    results.sort(key=lambda result: result.index)
+    return results
+
+
+def recordGame(layout, game, i):
+    import time
+    import pickle
+    fname = ('recorded-game-%d' % (i + 1)) + \
+        '-'.join([str(t) for t in time.localtime()[1:6]])
+    f = open(fname, 'wb')
+    components = {'layout': layout, 'actions': game.moveHistory}
+    pickle.dump(components, f)
+    f.close()
+
+
+def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30,
+             parallel=0, trusted=False):
+    """
+    Plays numGames games, the first numTraining of them quietly, and prints a
+    summary of the rest.  With parallel > 0 the training games are still
+    played here, one after the other, and the other games are played by that
+    many worker processes without graphics; they are then returned as
+    GameResults instead of Games.  With trusted, games are played by
+    Game.runTrusted unless catchExceptions is set.
+    """
     import __main__
     __main__.__dict__['_display'] = display
 
     rules = ClassicGameRules(timeout)
     games = []
 
-    for i in range(numGames):
+    numSerialGames = numTraining if parallel > 0 else numGames
+    for i in range(numSerialGames):
         beQuiet = i < numTraining
         if beQuiet:
                 # Suppress output and graphics
@@ -691,24 +878,28 @@ def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, c
             gameDisplay = display
             rules.quiet = False
         game = rules.newGame(layout, pacman, ghosts,
-                             gameDisplay, beQuiet, catchExceptions)
+                             gameDisplay, beQuiet, catchExceptions, trusted)
         game.run()
         if not beQuiet:
             games.append(game)
 
         if record:
-            import time
-            import pickle
-            fname = ('recorded-game-%d' % (i + 1)) + \
-                '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
+            recordGame(layout, game, i)
+
+    if parallel > 0:
+        games = runGamesInParallel(layout, pacman, ghosts, range(numTraining, numGames),
+                                   parallel, catchExceptions, timeout, trusted)
+        if record:
+            for game in games:
+                recordGame(layout, game, game.index)
 
     if (numGames-numTraining) > 0:
-        scores = [game.state.getScore() for game in games]
-        wins = [game.state.isWin() for game in games]
+        if parallel > 0:
+            scores = [game.score for game in games]
+            wins = [game.win for game in games]
+        else:
+            scores = [game.state.getScore() for game in games]
+            wins = [game.state.isWin() for game in games]
         winRate = wins.count(True) / float(len(wins))
         print('Average Score:', sum(scores) / float(len(scores)))
         print('Scores:       ', ', '.join([str(score) for score in scores]))
@@ -14,53 +14,57 @@
 
 """
 This file contains a Distancer object which computes and
-caches the shortest path between any two points in the maze. It
-returns a Manhattan distance between two points if the maze distance
-has not yet been calculated.
+caches the shortest path between any two points in the maze.
 
 Example:
 distancer = Distancer(gameState.data.layout)
 distancer.getDistance( (1,1), (10,10) )
 
-The Distancer object also serves as an example of sharing data
-safely among agents via a global dictionary (distanceMap),
-and performing asynchronous computation via threads. These
-examples may help you in designing your own objects, but you
-shouldn't need to modify the Distancer code in order to use its
+All maze distances of a layout are looked up in a dense matrix (a
+DistanceMatrix) holding the matrix of the layout's MazeDistanceOracle
+(distanceOracle.py), which computes it once and caches it on disk.  Matrices
+are cached per process in distanceMatrices and, when NumPy is available, shared
+with other processes on the same machine through
+multiprocessing.shared_memory, so every process that creates a Distancer
+for a layout after the first one just attaches to the existing matrix.
+You shouldn't need to modify the Distancer code in order to use its
 distances.
 """
 
-import threading, sys, time, random
+import atexit
+from distanceOracle import getMazeDistanceOracle, wallsKey, UNREACHABLE
+
+try:
+  import numpy as np
+  from multiprocessing import shared_memory
+except ImportError:
+  np = None
 
 class Distancer:
-  def __init__(self, layout, background=True, default=10000):
+  def __init__(self, layout, background=True, default=10000, useOracle=False):
     """
     Initialize with Distancer(layout).  Changing default is unnecessary.
 
-    This will start computing maze distances in the background and use them
-    as soon as they are ready.  In the meantime, it returns manhattan distance.
+    All maze distances are available as soon as the Distancer is created, so
+    background is ignored; it is kept so that existing callers still work.
+
+    To look distances up in the layout's MazeDistanceOracle (distanceOracle.py)
+    directly, without sharing its matrix between processes, set
+    useOracle=True.
 
-    To compute all maze distances on initialization, set background=False
+    Pairs of cells with no path between them are self.default apart, on and
+    off the grid alike.
     """
-    self._distances = None
     self.default = default
-
-    # Start computing distances in the background; when the dc finishes,
-    # it will fill in self._distances for us.
-    dc = DistanceCalculator()
-    dc.setAttr(layout, self)
-    dc.setDaemon(True)
-    if background:
-      dc.start()
+    if useOracle:
+      self._distances = getMazeDistanceOracle(layout.walls)
     else:
-      dc.run()
+      self._distances = getDistanceMatrix(layout.walls)
 
   def getDistance(self, pos1, pos2):
     """
     The getDistance function is the only one you'll need after you create the object.
     """
-    if self._distances == None:
-      return manhattanDistance(pos1, pos2)
     if isInt(pos1) and isInt(pos2):
       return self.getDistanceOnGrid(pos1, pos2)
     pos1Grids = getGrids2D(pos1)
@@ -75,14 +79,16 @@ class Distancer:
     return bestDistance
 
   def getDistanceOnGrid(self, pos1, pos2):
-    key = (pos1, pos2)
-    if key in self._distances:
-      return self._distances[key]
-    else:
-      raise Exception("Positions not in grid: " + str(key))
+    try:
+      distance = self._distances.getDistance(pos1, pos2)
+    except (KeyError, IndexError):
+      raise Exception("Positions not in grid: " + str((pos1, pos2)))
+    if distance == UNREACHABLE:
+      return self.default
+    return distance
 
   def isReadyForMazeDistance(self):
-    return self._distances != None
+    return True
 
 def manhattanDistance(x, y ):
   return abs( x[0] - y[0] ) + abs( x[1] - y[1] )
@@ -108,39 +114,114 @@ def getGrids1D(x):
 # MACHINERY FOR COMPUTING MAZE DISTANCES #
 ##########################################
 
-distanceMap = {}
-distanceMapSemaphore = threading.Semaphore(1)
-distanceThread = None
+distanceMatrices = {}
 
-def waitOnDistanceCalculator(t):
-  global distanceThread
-  if distanceThread != None:
-    time.sleep(t)
+class DistanceMatrix:
+  """
+  Unit-cost maze distances between every pair of open cells of a walls Grid.
 
-class DistanceCalculator(threading.Thread):
-  def setAttr(self, layout, distancer, default = 10000):
-    self.layout = layout
-    self.distancer = distancer
-    self.default = default
+  Open cells are numbered in walls.asList(False) order and cellIndex maps
+  the flat grid index x * height + y of every cell to that number (or -1
+  for walls), so a lookup is two index computations and one array read.
+  The distances come from the MazeDistanceOracle of the walls unless another
+  process has already shared them.
+  """
+  # Shared memory segments hold an 8 byte header (the number of cells and a
+  # ready flag, which is written last) followed by the uint16 matrix.
+  HEADER_BYTES = 8
+  READY = 0x50414321
 
-  def run(self):
-    global distanceMap, distanceThread
-    distanceMapSemaphore.acquire()
+  def __init__(self, walls, key):
+    self.width = walls.width
+    self.height = walls.height
+    self.key = key
+    self.cells = walls.asList(False)
+    self.cellIndex = [-1] * (self.width * self.height)
+    for i, (x, y) in enumerate(self.cells):
+      self.cellIndex[x * self.height + y] = i
+    self._sharedMemory = None
+    self.distances = None
+    if np is not None:
+      self.distances = self._attach()
+    if self.distances is None:
+      self.distances = getMazeDistanceOracle(walls).distances
+      if np is not None:
+        self._share()
 
-    if self.layout.walls not in distanceMap:
-      if distanceThread != None: raise Exception('Multiple distance threads')
-      distanceThread = self
+  def getCellIndex(self, pos):
+    "Returns the number of an open (x,y) cell, raising KeyError for others"
+    x, y = int(pos[0]), int(pos[1])
+    if not (0 <= x < self.width and 0 <= y < self.height):
+      raise KeyError(pos)
+    i = self.cellIndex[x * self.height + y]
+    if i < 0:
+      raise KeyError(pos)
+    return i
 
-      distances = computeDistances(self.layout)
-      print('[Distancer]: Switching to maze distances',file=sys.stdout)
+  def getDistance(self, pos1, pos2):
+    i, j = self.getCellIndex(pos1), self.getCellIndex(pos2)
+    if np is not None:
+      return int(self.distances[i, j])
+    return self.distances[i][j]
 
-      distanceMap[self.layout.walls] = distances
-      distanceThread = None
-    else:
-      distances = distanceMap[self.layout.walls]
+  def _sharedName(self):
+    return 'pacmanDist' + self.key[:16]
+
+  def _attach(self):
+    try:
+      # Since Python 3.13 attaching can skip the resource tracker, so that
+      # only the creating process unlinks the segment.  Older versions track
+      # it here too, which is harmless for child processes (they share the
+      # creator's tracker) but lets an unrelated process unlink it when it
+      # exits; later processes then simply compute and share it again.
+      try:
+        memory = shared_memory.SharedMemory(name=self._sharedName(), track=False)
+      except TypeError:
+        memory = shared_memory.SharedMemory(name=self._sharedName())
+    except OSError:
+      return None
+    numCells = len(self.cells)
+    header = np.ndarray((2,), dtype=np.uint32, buffer=memory.buf)
+    if header[0] != numCells or header[1] != DistanceMatrix.READY:
+      memory.close()
+      return None
+    self._sharedMemory = memory
+    return np.ndarray((numCells, numCells), dtype=np.uint16, buffer=memory.buf,
+                      offset=DistanceMatrix.HEADER_BYTES)
+
+  def _share(self):
+    numCells = len(self.cells)
+    try:
+      memory = shared_memory.SharedMemory(name=self._sharedName(), create=True,
+                                          size=DistanceMatrix.HEADER_BYTES + 2 * numCells * numCells)
+    except OSError:
+      return
+    shared = np.ndarray((numCells, numCells), dtype=np.uint16, buffer=memory.buf,
+                        offset=DistanceMatrix.HEADER_BYTES)
+    shared[:] = self.distances
+    header = np.ndarray((2,), dtype=np.uint32, buffer=memory.buf)
+    header[0] = numCells
+    header[1] = DistanceMatrix.READY
+    self.distances = shared
+    self._sharedMemory = memory
+    atexit.register(_releaseSharedMemory, memory)
+
+def _releaseSharedMemory(memory):
+  try:
+    memory.close()
+    memory.unlink()
+  except (FileNotFoundError, BufferError, OSError):
+    pass
 
-    distanceMapSemaphore.release()
-    self.distancer._distances = distances
+def getDistanceMatrix(walls):
+  """
+  Returns the DistanceMatrix for walls, computing it (or attaching to one
+  shared by another process) the first time a layout is seen.
+  """
+  key = wallsKey(walls)
+  if key not in distanceMatrices:
+    distanceMatrices[key] = DistanceMatrix(walls, key)
+  return distanceMatrices[key]
 
 def computeDistances(layout):
     distances = {}
@@ -151,7 +232,7 @@ def computeDistances(layout):
         for node in allNodes:
             dist[node] = 1000000000
         import util
-        queue = util.PriorityQueue()
+        queue = util.IndexedPriorityQueue()
         queue.push(source, 0)
         dist[source] = 0
         while not queue.isEmpty():
@@ -177,7 +258,7 @@ def computeDistances(layout):
                 newDist = nodeDist+1
                 if newDist < oldDist:
                     dist[other] = newDist
-                    queue.push(other, newDist)
+                    queue.update(other, newDist)
         for target in allNodes:
             distances[(target, source)] = dist[target]
     return distances
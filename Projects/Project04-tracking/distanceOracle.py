@@ -0,0 +1,198 @@
+# distanceOracle.py
+# -----------------
+# All-pairs maze distances for a layout, computed once and cached on disk.
+
+
+"""
+A MazeDistanceOracle answers maze distance queries between any two open
+cells of a layout with a single table lookup.
+
+The open cells of the walls Grid are numbered 0..n-1 (in Grid.asList(False)
+order) and the distances between all pairs of them are computed once, with a
+breadth first search from every cell (computeDistanceMatrix, which advances
+all the searches together with NumPy), into an n x n uint16 matrix.  When
+NumPy is available the matrix is saved to CACHE_DIRECTORY under a hash of
+the walls, and later runs on the same layout load it with
+np.load(mmap_mode='r') instead of recomputing it.
+
+Example:
+oracle = getMazeDistanceOracle(gameState.getWalls())
+oracle.getDistance( (1,1), (10,10) )
+"""
+
+import os
+import hashlib
+from array import array
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'distanceCache')
+UNREACHABLE = 65535 # Distance stored for pairs of cells with no path between them
+
+class MazeDistanceOracle:
+    """
+    All-pairs shortest path distances between the open cells of a walls Grid.
+    """
+
+    def __init__(self, walls, cacheDirectory=CACHE_DIRECTORY):
+        """
+        walls: the walls Grid of a layout
+        cacheDirectory: where distance matrices are saved, or None to always
+                        compute them in memory
+        """
+        self.cells = walls.asList(False)
+        self.cellIds = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.key = wallsKey(walls)
+        self.distances = None
+        path = None
+        if np is not None and cacheDirectory is not None:
+            path = os.path.join(cacheDirectory, self.key + '.npy')
+            self.distances = self._load(path)
+        if self.distances is None:
+            self.distances = self._compute(walls)
+            if path is not None:
+                self._save(path)
+
+    def getCellId(self, position):
+        """
+        Returns the integer ID of an open (x,y) cell.
+        """
+        return self.cellIds[position]
+
+    def getDistance(self, pos1, pos2):
+        """
+        Returns the maze distance between two open cells, or UNREACHABLE if
+        there is no path between them.
+        """
+        i, j = self.cellIds[pos1], self.cellIds[pos2]
+        if np is not None:
+            return int(self.distances[i, j])
+        return self.distances[i][j]
+
+    def getDistancesFrom(self, position):
+        """
+        Returns the row of distances from position to every cell ID.
+        """
+        return self.distances[self.cellIds[position]]
+
+    def _compute(self, walls):
+        if np is None:
+            return computeDistanceRows(self.cells)
+        return computeDistanceMatrix(self.cells)
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+        try:
+            distances = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        numCells = len(self.cells)
+        if distances.shape != (numCells, numCells) or distances.dtype != np.uint16:
+            return None
+        # A plain ndarray view still reads from the mapped file, but indexes
+        # without the np.memmap subclass overhead.
+        return distances.view(np.ndarray)
+
+    def _save(self, path):
+        # Write to a temporary file first so that concurrent runs never load
+        # a partially written matrix.
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporaryPath = '%s.%d.tmp' % (path, os.getpid())
+            with open(temporaryPath, 'wb') as f:
+                np.save(f, self.distances)
+            os.replace(temporaryPath, path)
+        except OSError:
+            pass
+
+def _neighborTable(cells):
+    cellIds = dict((cell, i) for i, cell in enumerate(cells))
+    neighbors = []
+    for x, y in cells:
+        neighbors.append([cellIds.get(cell, -1) for cell in
+                          ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y))])
+    return neighbors
+
+def computeDistanceMatrix(cells):
+    """
+    Breadth first search from every cell at once.  Row s of frontier marks the
+    cells at the current distance from source s; each step gathers the
+    frontier of every source through the four neighbor index arrays, so the
+    whole search takes (maze diameter) NumPy steps of O(n^2) work each.
+    Returns the n x n uint16 matrix, UNREACHABLE where there is no path.
+    """
+    numCells = len(cells)
+    # Column numCells is an always-empty dummy cell standing in for walls
+    neighbors = np.array(_neighborTable(cells), dtype=np.intp).T
+    neighbors[neighbors < 0] = numCells
+    distances = np.full((numCells, numCells), UNREACHABLE, dtype=np.uint16)
+    reached = np.eye(numCells, dtype=bool)
+    frontier = np.zeros((numCells, numCells + 1), dtype=bool)
+    frontier[:, :numCells] = reached
+    np.fill_diagonal(distances, 0)
+    distance = 0
+    while True:
+        distance += 1
+        step = frontier[:, neighbors[0]]
+        for direction in neighbors[1:]:
+            step |= frontier[:, direction]
+        step &= ~reached
+        if not step.any():
+            break
+        distances[step] = distance
+        reached |= step
+        frontier[:, :numCells] = step
+    return distances
+
+def computeDistanceRows(cells):
+    """
+    The same distances as computeDistanceMatrix, as a list of array('H') rows
+    computed with one breadth first search per cell, for when NumPy is not
+    installed.
+    """
+    neighbors = _neighborTable(cells)
+    rows = []
+    for source in range(len(cells)):
+        row = array('H', [UNREACHABLE]) * len(cells)
+        row[source] = 0
+        queue = deque([source])
+        while queue:
+            cell = queue.popleft()
+            nextDistance = row[cell] + 1
+            for neighbor in neighbors[cell]:
+                if neighbor >= 0 and row[neighbor] == UNREACHABLE:
+                    row[neighbor] = nextDistance
+                    queue.append(neighbor)
+        rows.append(row)
+    return rows
+
+def wallsKey(walls):
+    """
+    Returns a hex digest identifying the shape of a walls Grid.
+    """
+    cells = ''.join(['1' if wall else '0' for column in walls.data for wall in column])
+    text = '%d,%d,%s' % (walls.width, walls.height, cells)
+    return hashlib.sha1(text.encode('ascii')).hexdigest()
+
+_oracles = {}
+_oraclesByWalls = {}
+
+def getMazeDistanceOracle(walls, cacheDirectory=CACHE_DIRECTORY):
+    """
+    Returns the MazeDistanceOracle for walls, building (or loading) it the
+    first time a layout is seen in this process.
+    """
+    entry = _oraclesByWalls.get(id(walls))
+    if entry is not None and entry[0] is walls:
+        return entry[1]
+    key = wallsKey(walls)
+    if key not in _oracles:
+        _oracles[key] = MazeDistanceOracle(walls, cacheDirectory)
+    # Keep a reference to walls so that its id cannot be reused while cached
+    _oraclesByWalls[id(walls)] = (walls, _oracles[key])
+    return _oracles[key]